@@ -47,10 +47,10 @@ CMD_FLOW_CONTROL = 10  # Flow control command
 
 # Chunk size for file transfer
 CHUNK_SIZE = 19   # BLE characteristic write limit (20 bytes - 1 for command byte)
+SERVER_MTU_MAX = 247  # Largest ATT MTU the PicoCalc offers (must match server)
 MAX_DEST_PATH_LENGTH = 18  # BLE characteristic write limit minus command byte
 MAX_RETRIES = 5  # Number of retries for sending chunks
 ACK_TIMEOUT = 2.0  # Timeout in seconds for waiting for ACK
-FLOW_CONTROL_WINDOW = 3  # Max chunks before requiring ACK
 
 # Config file for storing device preferences
 CONFIG_FILE = "picocalc_client_config.json"
@@ -711,6 +711,32 @@ class EnhancedBLEClient:
             print(f"Error sending command: {e}")
             return bytearray()
     
+    def data_chunk_size(self) -> int:
+        """File data bytes per write for the negotiated ATT MTU"""
+        try:
+            mtu = self.client.mtu_size
+        except Exception:
+            mtu = 23  # Default ATT MTU
+        # ATT write header is 3 bytes, plus our command byte
+        return max(CHUNK_SIZE, min(mtu, SERVER_MTU_MAX) - 3 - 1)
+    
+    async def send_data(self, command: int, data: bytes = b'') -> bool:
+        """Send command without waiting for a notification (used inside an ACK window)"""
+        try:
+            cmd_data = bytearray([command]) + data
+            for retry in range(MAX_RETRIES):
+                try:
+                    await self.client.write_gatt_char(self.tx_char, cmd_data, response=True)
+                    return True
+                except Exception as e:
+                    if retry < MAX_RETRIES - 1:
+                        await asyncio.sleep(0.1 * (retry + 1))  # Exponential backoff
+                    else:
+                        raise e
+        except Exception as e:
+            print(f"Error sending command: {e}")
+            return False
+    
     async def list_directory(self, path: str = "/sd") -> dict:
         """List directory contents"""
         print(f"Listing directory: {path}")
@@ -838,21 +864,47 @@ class EnhancedBLEClient:
             if not response or response[0] != CMD_FILE_INFO or response[1] != 0:
                 print(f"Error: Failed to start transfer. Response: {response.hex() if response else 'None'}")
                 return False
+            
+            # Servers that batch ACKs send the window size as a third byte;
+            # older ones ACK every chunk
+            ack_window = response[2] if len(response) > 2 and response[2] else 1
 
             # Set file transfer active flag
             self._file_transfer_active = True
 
+            chunk_size = self.data_chunk_size()
+            if self.verbose:
+                print(f"Using {chunk_size}-byte data chunks")
+            
             with open(source, "rb") as f:
                 bytes_sent = 0
+                chunks_sent = 0
                 
                 while True:
-                    chunk = f.read(CHUNK_SIZE)
+                    chunk = f.read(chunk_size)
                     if not chunk:
                         break
                     
-                    # Send chunk with simple retry logic
-                    response = await self.send_command(CMD_FILE_DATA, chunk)
-                    if not response or response[0] != CMD_FILE_DATA or response[1] != 0:
+                    # Only the last chunk of each window waits for an ACK
+                    chunks_sent += 1
+                    if chunks_sent % ack_window == 0:
+                        response = await self.send_command(CMD_FILE_DATA, chunk)
+                        ack_cmd = CMD_FILE_DATA
+                        if not response:
+                            # Checkpoint ACK lost: ask for a snapshot of the
+                            # server's byte count rather than aborting
+                            response = await self.send_command(CMD_FLOW_CONTROL)
+                            ack_cmd = CMD_FLOW_CONTROL
+                        ok = response and response[0] == ack_cmd and response[1] == 0
+                        # Checkpoint ACKs carry the server's running byte count
+                        if ok and len(response) >= 6:
+                            received = struct.unpack("<I", response[2:6])[0]
+                            if received != bytes_sent + len(chunk):
+                                print(f"\nError: Server has {received:,} of {bytes_sent + len(chunk):,} bytes")
+                                ok = False
+                    else:
+                        ok = await self.send_data(CMD_FILE_DATA, chunk)
+                    if not ok:
                         print(f"\nError: Failed to send data chunk at {bytes_sent} bytes")
                         self._file_transfer_active = False
                         return False
@@ -862,8 +914,8 @@ class EnhancedBLEClient:
                     bar = "█" * (progress // 5) + "░" * (20 - progress // 5)
                     print(f"\rProgress: [{bar}] {progress}% ({bytes_sent:,}/{file_size:,} bytes)", end="")
                     
-                    # Small delay to prevent overwhelming the server
-                    await asyncio.sleep(0.01)
+                    # No pacing sleep: each write waits for the ATT write
+                    # response, and every window waits for the server's ACK
 
             # Send file end command with original filename for server rename
             original_filename_data = b''
@@ -874,6 +926,14 @@ class EnhancedBLEClient:
             if not response or response[0] != CMD_FILE_END or response[1] != 0:
                 print("\nError: Failed to end transfer")
                 return False
+            
+            # Chunks inside a window are not ACKed, so check the server's total
+            if len(response) >= 6:
+                received = struct.unpack("<I", response[2:6])[0]
+                if received != bytes_sent:
+                    print(f"\nError: Server received {received:,} of {bytes_sent:,} bytes")
+                    self._file_transfer_active = False
+                    return False
 
             if original_filename_data:
                 print(f"\nTransfer complete! File renamed to '{self.original_filename}' on server")
@@ -7,7 +7,9 @@ import time
 import gc
 import sd_chk
 
-paths_to_add = ["/sd/py_scripts", "/modules"]
+# /sd/mpy (precompiled bytecode, see py_scripts/build_mpy.sh) is searched
+# before /sd/py_scripts
+paths_to_add = ["/sd/py_scripts", "/sd/mpy", "/modules"]
 for path in paths_to_add:
     if path not in sys.path:
         sys.path.insert(0, path)
@@ -2,6 +2,14 @@ import os
 import sys
 import gc
 
+_FLUSH_EXCLUDE = frozenset(("os", "sys", "gc"))
+
+# Script list cache. The FAT root's stat carries no usable mtime, so the
+# list is rescanned only when invalidate_py_files() drops it: on R/F, after
+# file management, and after running a script (which may add files, e.g.
+# PicoBLE uploads)
+_scripts_cache = None
+
 def find_py_files(base_path="/sd"):
     py_files = []
     try:
@@ -93,12 +101,14 @@ def run_script(script_path, base_path="/sd"):
     except Exception as e:
         print(f"Failed running {script_path}: {e}")
 
-def flush_modules(exclude=("os", "sys", "gc")):
+def flush_modules(exclude=_FLUSH_EXCLUDE):
     flushed = []
     for name in list(sys.modules):
-        if name not in exclude and not name.startswith("micropython"):
-            sys.modules.pop(name, None)
-            flushed.append(name)
+        if name in exclude or (name[:1] == "m" and name.startswith("micropython")):
+            continue
+        sys.modules.pop(name, None)
+        flushed.append(name)
+    gc.collect()
     print(f"Flushed: {', '.join(flushed)}")
 
 def show_memory():
@@ -197,9 +207,20 @@ def file_management_menu():
             print("Invalid choice.")
             input("Press Enter to continue...")
 
+def get_py_files():
+    """Return cached script list, rescanning only after an invalidation"""
+    global _scripts_cache
+    if _scripts_cache is None:
+        _scripts_cache = find_py_files()
+    return _scripts_cache
+
+def invalidate_py_files():
+    global _scripts_cache
+    _scripts_cache = None
+
 def main_menu():
     while True:
-        scripts = find_py_files()
+        scripts = get_py_files()
         print("\n=== PicoCalc Main Menu ===")
         for i, name in enumerate(scripts):
             print(f"{i + 1}: Run {name}")
@@ -218,15 +239,18 @@ def main_menu():
             return
         elif choice == "r":
             print("Reloading menu...")
+            invalidate_py_files()
             continue
         elif choice == "f":
             flush_modules()
+            invalidate_py_files()
             continue
         elif choice == "m":
             show_memory()
             continue
         elif choice == "t":
             file_management_menu()
+            invalidate_py_files()
             continue
         else:
             try:
@@ -234,6 +258,7 @@ def main_menu():
                 if 0 <= index < len(scripts):
                     print(f"\nRunning {scripts[index]}...\n")
                     run_script(scripts[index])
+                    invalidate_py_files()  # The script may have changed files
                     input("\nDone. Press Enter to return to menu...")
                 else:
                     print("Invalid selection.")
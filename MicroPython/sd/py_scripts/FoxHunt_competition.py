@@ -8,13 +8,57 @@ import time
 import math
 import os
 from machine import Pin, PWM, ADC
+from sdlog import LOG_DIR, ensure_log_dir
 
 # Competition Configuration
-LOG_FILE = "/sd/logs/competition_log.txt"
+LOG_FILE = LOG_DIR + "/competition_log.txt"
 RSSI_AT_1M = -59  # Calibration value
 N_FACTOR = 2.0    # Path loss exponent
 AUDIO_PIN = 28
 ANTENNA_SAMPLES = 10  # Samples per direction
+_CLEAR_SCREEN = "\x1b[2J\x1b[H"  # VT100 clear screen + cursor home
+
+# Distance estimate (m) for -30..-100 dBm, built once at load
+_DIST_LUT = tuple(round(10 ** ((RSSI_AT_1M - r) / (10 * N_FACTOR)), 1)
+                  for r in range(-30, -101, -1))
+
+def _fmt_mac(b):
+    """Format raw address bytes as AA:BB:CC:DD:EE:FF"""
+    return b.hex(':').upper()
+
+try:
+    _fmt_mac(b"\x00\x00")
+except TypeError:
+    # Older firmware: bytes.hex() has no separator argument
+    def _fmt_mac(b):
+        h = b.hex().upper()
+        return ':'.join(h[i:i + 2] for i in range(0, len(h), 2))
+
+def _clock(with_date=False):
+    """Local time as HH:MM:SS, prefixed with YYYY-MM-DD if with_date
+
+    MicroPython's time module has no strftime, so format localtime() here.
+    """
+    t = time.localtime()
+    hms = "%02d:%02d:%02d" % (t[3], t[4], t[5])
+    if with_date:
+        return "%04d-%02d-%02d %s" % (t[0], t[1], t[2], hms)
+    return hms
+
+def _top_devices(devices, n=5):
+    """Return the n strongest (mac, data) pairs, strongest first"""
+    top = []
+    for item in devices.items():
+        rssi = item[1]['rssi']
+        if len(top) == n and rssi <= top[-1][1]['rssi']:
+            continue
+        i = len(top)
+        while i and top[i - 1][1]['rssi'] < rssi:
+            i -= 1
+        top.insert(i, item)
+        if len(top) > n:
+            top.pop()
+    return top
 
 class CompetitionFoxHunt:
     def __init__(self):
@@ -39,6 +83,7 @@ class CompetitionFoxHunt:
         
         # Direction finding data
         self.rssi_samples = []  # Store RSSI readings
+        self.sample_count = 0  # Readings seen in total (the buffer is capped)
         self.bearing_samples = {}  # RSSI by direction
         self.estimated_bearing = 0
         self.confidence = 0
@@ -47,6 +92,7 @@ class CompetitionFoxHunt:
         self.start_time = None
         self.found_time = None
         self.waypoints = []
+        self._log_fh = None  # Persistent log handle for the session
         
         # Signal processing
         self.signal_history = []
@@ -61,7 +107,7 @@ class CompetitionFoxHunt:
         if event == 5 and self.scanning:  # ADV received
             try:
                 addr_type, addr, adv_type, rssi, adv_data = data
-                mac = ':'.join(['%02X' % b for b in bytes(addr)])
+                mac = _fmt_mac(bytes(addr))
                 
                 # In competition mode, only track target
                 if self.competition_mode and mac == self.target_mac:
@@ -82,19 +128,17 @@ class CompetitionFoxHunt:
     def decode_name(self, adv_data):
         """Decode device name"""
         try:
-            if isinstance(adv_data, memoryview):
-                adv_data = bytes(adv_data)
+            mv = memoryview(adv_data)  # No copy of the whole payload
             
             i = 0
-            while i < len(adv_data):
-                if i >= len(adv_data):
+            n = len(mv)
+            while i < n:
+                length = mv[i]
+                if length == 0 or i + length >= n:
                     break
-                length = adv_data[i]
-                if length == 0 or i + length >= len(adv_data):
-                    break
-                if adv_data[i + 1] == 0x09:  # Complete Local Name
+                if mv[i + 1] == 0x09:  # Complete Local Name
                     try:
-                        return adv_data[i + 2:i + 1 + length].decode("utf-8")
+                        return bytes(mv[i + 2:i + 1 + length]).decode("utf-8")
                     except:
                         return ""
                 i += 1 + length
@@ -106,6 +150,7 @@ class CompetitionFoxHunt:
         """Process RSSI for direction finding"""
         # Add to samples
         self.rssi_samples.append(rssi)
+        self.sample_count += 1
         if len(self.rssi_samples) > 50:
             self.rssi_samples.pop(0)
         
@@ -169,15 +214,14 @@ class CompetitionFoxHunt:
             if cmd == 'q':
                 break
             
-            # Collect samples
+            # Collect samples: let the IRQ fill the rolling buffer for
+            # 3 seconds, then take the readings that arrived meanwhile. The
+            # buffer itself is left alone, it feeds the running average.
             print(f"Sampling {direction}...")
-            samples = []
-            start = time.time()
-            
-            while time.time() - start < 3:  # 3 second sample
-                if self.rssi_samples:
-                    samples.extend(self.rssi_samples[-5:])
-                time.sleep(0.1)
+            start = self.sample_count
+            time.sleep(3)
+            new = min(self.sample_count - start, len(self.rssi_samples))
+            samples = self.rssi_samples[-new:] if new else []
             
             if samples:
                 avg = sum(samples) / len(samples)
@@ -219,8 +263,9 @@ class CompetitionFoxHunt:
         self.competition_mode = True
         self.start_time = time.time()
         self.waypoints = []
+        
         print("\n=== COMPETITION STARTED ===")
-        print(f"Time: {time.strftime('%H:%M:%S', time.localtime())}")
+        print(f"Time: {_clock()}")
         print(f"Target: {self.target_name or self.target_mac}")
         print("\nGood luck!")
     
@@ -240,6 +285,15 @@ class CompetitionFoxHunt:
         print(f"Signal: {waypoint['rssi']:.1f} dBm")
         print(f"Bearing: {waypoint['bearing']}°")
     
+    def close_log(self):
+        """Close the persistent session log"""
+        if self._log_fh:
+            try:
+                self._log_fh.close()
+            except Exception:
+                pass
+            self._log_fh = None
+    
     def found_fox(self):
         """Mark fox as found"""
         if not self.competition_mode:
@@ -256,30 +310,36 @@ class CompetitionFoxHunt:
         
         # Log competition results
         self.log_competition()
+        self.close_log()
     
     def log_competition(self):
         """Log competition results"""
         try:
-            os.makedirs("/sd/logs", exist_ok=True)
+            # Opened on the first log of the session and kept open until
+            # close_log, so repeated logs skip the directory check and open
+            f = self._log_fh
+            if f is None:
+                ensure_log_dir()
+                f = self._log_fh = open(LOG_FILE, "a")
             
-            with open(LOG_FILE, "a") as f:
-                f.write(f"\n=== Competition Log ===\n")
-                f.write(f"Date: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}\n")
-                f.write(f"Target: {self.target_name} ({self.target_mac})\n")
-                
-                if self.found_time:
-                    elapsed = self.found_time - self.start_time
-                    f.write(f"Found in: {elapsed//60:.0f}m {elapsed%60:.0f}s\n")
-                    f.write(f"Peak signal: {self.peak_rssi} dBm\n")
-                    
-                    # Log waypoints
-                    f.write(f"\nWaypoints ({len(self.waypoints)}):\n")
-                    for i, wp in enumerate(self.waypoints):
-                        f.write(f"  #{i+1}: {wp['time']:.0f}s, "
-                               f"{wp['rssi']:.1f}dBm, {wp['bearing']}°\n")
-                else:
-                    f.write("Status: In progress\n")
+            f.write(f"\n=== Competition Log ===\n")
+            f.write(f"Date: {_clock(True)}\n")
+            f.write(f"Target: {self.target_name} ({self.target_mac})\n")
+            
+            if self.found_time:
+                elapsed = self.found_time - self.start_time
+                f.write(f"Found in: {elapsed//60:.0f}m {elapsed%60:.0f}s\n")
+                f.write(f"Peak signal: {self.peak_rssi} dBm\n")
                 
+                # Log waypoints
+                f.write(f"\nWaypoints ({len(self.waypoints)}):\n")
+                for i, wp in enumerate(self.waypoints):
+                    f.write(f"  #{i+1}: {wp['time']:.0f}s, "
+                           f"{wp['rssi']:.1f}dBm, {wp['bearing']}°\n")
+            else:
+                f.write("Status: In progress\n")
+            f.flush()
+            
             print("Results logged")
         except Exception as e:
             print(f"Log error: {e}")
@@ -290,10 +350,10 @@ class CompetitionFoxHunt:
             print("Not in competition mode")
             return
         
-        elapsed = time.time() - self.start_time
+        mins, secs = divmod(int(time.time() - self.start_time), 60)
         
         print("\n" + "=" * 50)
-        print(f"COMPETITION MODE - {elapsed//60:.0f}:{elapsed%60:02.0f}")
+        print(f"COMPETITION MODE - {mins}:{secs:02d}")
         print("=" * 50)
         
         # Signal status
@@ -314,7 +374,8 @@ class CompetitionFoxHunt:
                 print(f"Confidence: {self.confidence}%")
             
             # Distance estimate (rough)
-            distance = 10 ** ((RSSI_AT_1M - self.avg_rssi) / (10 * N_FACTOR))
+            idx = max(0, min(70, -30 - int(self.avg_rssi)))
+            distance = _DIST_LUT[idx]
             print(f"Est. distance: {distance:.1f}m")
         else:
             print("No signal detected")
@@ -329,19 +390,22 @@ class CompetitionFoxHunt:
         self.scanning = True
         self.ble.gap_scan(0, 30000, 30000)
         
-        last_display = 0
+        last_display_sec = -1
         
-        while self.competition_mode:
-            # Update display every second
-            if time.time() - last_display > 1:
-                print("\n" * 30)  # Clear screen
-                self.show_competition_display()
-                last_display = time.time()
-            
-            time.sleep(0.1)
-        
-        self.scanning = False
-        self.ble.gap_scan(None)
+        try:
+            while self.competition_mode:
+                # Update display only when the second boundary changes
+                now_sec = int(time.time())
+                if now_sec != last_display_sec:
+                    print(_CLEAR_SCREEN, end="")  # Clear screen
+                    self.show_competition_display()
+                    last_display_sec = now_sec
+                
+                time.sleep(0.1)
+        finally:
+            self.close_log()
+            self.scanning = False
+            self.ble.gap_scan(None)
 
 def competition_menu():
     """Competition-focused menu"""
@@ -374,9 +438,7 @@ def competition_menu():
             
             if hasattr(scanner, 'devices') and scanner.devices:
                 print(f"\nFound {len(scanner.devices)} transmitters:")
-                for i, (mac, data) in enumerate(sorted(scanner.devices.items(),
-                                                      key=lambda x: x[1]['rssi'], 
-                                                      reverse=True)[:5], 1):
+                for i, (mac, data) in enumerate(_top_devices(scanner.devices), 1):
                     print(f"{i}. {mac} ({data['rssi']}dBm) {data['name']}")
             else:
                 print("No transmitters found")
@@ -385,8 +447,7 @@ def competition_menu():
             # Select target
             if hasattr(scanner, 'devices') and scanner.devices:
                 print("\nSelect target:")
-                devices = sorted(scanner.devices.items(),
-                               key=lambda x: x[1]['rssi'], reverse=True)[:5]
+                devices = _top_devices(scanner.devices)
                 
                 for i, (mac, data) in enumerate(devices, 1):
                     print(f"{i}. {mac} ({data['rssi']}dBm) {data['name']}")
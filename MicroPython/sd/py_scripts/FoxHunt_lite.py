@@ -4,16 +4,73 @@ Text-based interface optimized for PicoCalc
 """
 
 import bluetooth
+import micropython
 import time
 import math
 import os
+import sys
+import select
+from array import array
 from machine import Pin, PWM
+from micropython import const
+from sdlog import LOG_DIR, ensure_log_dir
+
+try:
+    import picocalc
+except ImportError:
+    picocalc = None
 
 # Configuration
-LOG_FILE = "/sd/logs/foxhunt_log.txt"
-RSSI_AT_1M = -59
+LOG_FILE = LOG_DIR + "/foxhunt_log.txt"
+RSSI_AT_1M = const(-59)
 N_FACTOR = 2.0
-AUDIO_PIN = 28
+AUDIO_PIN = const(28)
+_CLEAR_SCREEN = "\x1b[2J\x1b[H"  # VT100 clear screen + cursor home
+MAX_DEVICES = const(64)  # Cap on tracked devices to bound heap use
+HISTORY_LEN = const(20)  # Target history ring buffer size
+# gap_scan interval/window in microseconds (milliseconds on very old
+# firmware); the controller rounds to 625 us units
+SCAN_INTERVAL_US = const(160000)  # Survey: catch beacons at low IRQ load
+SCAN_WINDOW_US = const(40000)
+HUNT_INTERVAL_US = const(11250)   # Hunt: minimum interval, radio always on
+HUNT_WINDOW_US = const(11250)
+ADV_SLOTS = const(64)    # IRQ -> main loop ring buffer depth
+ADV_SLOT = const(40)     # 6B addr + 1B rssi + 1B len + 31B adv data + pad
+ADV_MAX = const(31)      # Legacy advertising payload limit
+_ADV_TYPE_SHORT_NAME = const(0x08)
+_ADV_TYPE_NAME = const(0x09)
+KF_Q = 0.003  # RSSI Kalman process noise
+KF_R = 1.0    # RSSI Kalman measurement noise
+
+def _fmt_mac(b):
+    """Format raw address bytes as AA:BB:CC:DD:EE:FF"""
+    return b.hex(':').upper()
+
+try:
+    _fmt_mac(b"\x00\x00")
+except TypeError:
+    # Older firmware: bytes.hex() has no separator argument
+    def _fmt_mac(b):
+        h = b.hex().upper()
+        return ':'.join(h[i:i + 2] for i in range(0, len(h), 2))
+
+@micropython.native
+def _parse_adv(adv_data):
+    """Return the local name bytes of an advertisement, or b''"""
+    short = b""
+    i = 0
+    n = len(adv_data)
+    while i < n:
+        length = adv_data[i]
+        if length == 0 or i + length >= n:
+            break
+        type_ = adv_data[i + 1]
+        if type_ == _ADV_TYPE_NAME:
+            return bytes(adv_data[i + 2:i + 1 + length])
+        if type_ == _ADV_TYPE_SHORT_NAME:  # Fallback if no complete name
+            short = bytes(adv_data[i + 2:i + 1 + length])
+        i += 1 + length  # Jump straight to the next field
+    return short
 
 class FoxHuntLite:
     def __init__(self):
@@ -36,7 +93,36 @@ class FoxHuntLite:
         self.devices = {}
         self.target_mac = None
         self.target_name = ""
-        self.target_history = []
+        
+        # Target history as ring-buffer columns (no per-update allocation)
+        self._hist_rssi = array('h', [0] * HISTORY_LEN)
+        self._hist_dist = array('h', [0] * HISTORY_LEN)  # decimeters
+        self._hist_bear = array('h', [0] * HISTORY_LEN)
+        self._hist_time = array('i', [0] * HISTORY_LEN)  # ticks_ms
+        self._hist_idx = 0
+        self._hist_len = 0
+        
+        # ADV ring buffer filled by ble_irq, drained by the main loop
+        self._adv_buf = bytearray(ADV_SLOTS * ADV_SLOT)
+        self._adv_mv = memoryview(self._adv_buf)
+        self._adv_wr = 0
+        self._adv_rd = 0
+        
+        # Reused signal bar buffer for the hunt display
+        self._bar = bytearray(b'-' * 20)
+        
+        # Non-blocking key input: PicoCalc terminal, or poll on serial stdin
+        self.key_buffer = bytearray(10)
+        self._poll = select.poll()
+        self._poll.register(sys.stdin, select.POLLIN)
+        
+        # Scalar Kalman filter state for target RSSI
+        self._kf_x = None
+        self._kf_P = 1.0
+        
+        # Distance (m) for RSSI -127..-1 dBm, avoids float pow per ADV
+        self._dist_table = tuple(round(10 ** ((RSSI_AT_1M - r) / (10 * N_FACTOR)), 1)
+                                 for r in range(-127, 0))
         
         # Simulated bearing (for demo purposes)
         self.bearing = 0
@@ -46,87 +132,162 @@ class FoxHuntLite:
         print("Audio:", "Enabled" if self.audio_enabled else "Disabled")
     
     def ble_irq(self, event, data):
-        """BLE interrupt handler"""
+        """BLE interrupt handler - copies the ADV into the ring buffer"""
         if event == 5 and self.scanning:  # ADV received
             try:
                 addr_type, addr, adv_type, rssi, adv_data = data
-                mac = ':'.join(['%02X' % b for b in bytes(addr)])
-                name = self.decode_name(adv_data)
-                
-                self.devices[mac] = {
-                    'rssi': rssi,
-                    'name': name,
-                    'last_seen': time.time(),
-                    'distance': self.rssi_to_distance(rssi)
-                }
+                wr = self._adv_wr
+                nxt = (wr + 1) % ADV_SLOTS
+                if nxt == self._adv_rd:
+                    return  # Buffer full, drop this ADV
                 
-                # Update target if tracking
-                if self.mode == "HUNT" and mac == self.target_mac:
-                    self.update_target(rssi)
+                mv = self._adv_mv
+                off = wr * ADV_SLOT
+                mv[off:off + 6] = addr
+                mv[off + 6] = rssi & 0xFF
+                n = len(adv_data)
+                if n > ADV_MAX:
+                    n = ADV_MAX
+                    adv_data = adv_data[:n]
+                mv[off + 7] = n
+                mv[off + 8:off + 8 + n] = adv_data
+                self._adv_wr = nxt
             except:
                 pass
     
+    def drain_adv(self):
+        """Process ADVs queued by ble_irq (call from the main loop)"""
+        mv = self._adv_mv
+        rd = self._adv_rd
+        while rd != self._adv_wr:
+            off = rd * ADV_SLOT
+            rssi = mv[off + 6]
+            if rssi > 127:
+                rssi -= 256
+            n = mv[off + 7]
+            try:
+                self.record_adv(bytes(mv[off:off + 6]), rssi,
+                                mv[off + 8:off + 8 + n])
+            except:
+                pass
+            rd = (rd + 1) % ADV_SLOTS
+            self._adv_rd = rd
+    
+    def reset_adv(self):
+        """Discard any queued ADVs"""
+        self._adv_rd = self._adv_wr
+    
+    def record_adv(self, key, rssi, adv_data):
+        """Update the device table from one advertisement"""
+        devices = self.devices
+        
+        # Repeat ADVs from a named device skip the TLV parse
+        existing = devices.get(key)
+        if existing and existing['name']:
+            name = existing['name']
+        else:
+            name = self.decode_name(adv_data)
+        
+        if key not in devices and len(devices) >= MAX_DEVICES:
+            # Evict the weakest non-target device
+            target = self.target_mac
+            others = [k for k in devices if k != target]
+            if not others:
+                return
+            del devices[min(others, key=lambda k: devices[k]['rssi'])]
+        
+        devices[key] = {
+            'rssi': rssi,
+            'name': name,
+            'last_seen': time.ticks_ms(),
+            'distance': self.rssi_to_distance(rssi)
+        }
+        
+        # Update target if tracking
+        if self.mode == "HUNT" and key == self.target_mac:
+            self.update_target(rssi)
+    
     def decode_name(self, adv_data):
         """Decode device name from advertisement data"""
         try:
-            if isinstance(adv_data, memoryview):
-                adv_data = bytes(adv_data)
-            
-            i = 0
-            while i < len(adv_data):
-                if i >= len(adv_data):
-                    break
-                length = adv_data[i]
-                if length == 0 or i + length >= len(adv_data):
-                    break
-                type_ = adv_data[i + 1]
-                if type_ == 0x09:  # Complete Local Name
-                    try:
-                        return adv_data[i + 2:i + 1 + length].decode("utf-8")
-                    except:
-                        return ""
-                i += 1 + length
-            return ""
+            return _parse_adv(adv_data).decode("utf-8")
         except:
             return ""
     
+    @micropython.native
     def rssi_to_distance(self, rssi):
         """Convert RSSI to estimated distance in meters"""
-        try:
-            if rssi >= 0:
-                return 0.1
-            distance = 10 ** ((RSSI_AT_1M - rssi) / (10 * N_FACTOR))
-            return round(distance, 1)
-        except:
-            return 999.9
+        if rssi >= 0:
+            return 0.1
+        if rssi < -127:
+            rssi = -127
+        return self._dist_table[rssi + 127]
+    
+    def filter_rssi(self, rssi):
+        """Smooth raw RSSI with a 1-D Kalman filter"""
+        if self._kf_x is None:
+            self._kf_x = rssi
+            self._kf_P = 1.0
+            return rssi
+        P = self._kf_P + KF_Q
+        K = P / (P + KF_R)
+        self._kf_x += K * (rssi - self._kf_x)
+        self._kf_P = (1 - K) * P
+        return int(round(self._kf_x))
     
     def update_target(self, rssi):
         """Update target tracking data"""
+        rssi = self.filter_rssi(rssi)
         self.last_rssi = rssi
         
+        idx = self._hist_idx
+        
         # Simple bearing simulation based on signal change
-        if len(self.target_history) > 0:
-            rssi_diff = rssi - self.target_history[-1]['rssi']
+        if self._hist_len > 0:
+            rssi_diff = rssi - self._hist_rssi[(idx - 1) % HISTORY_LEN]
             # Stronger signal = likely getting closer from current bearing
             # Weaker signal = likely moving away
             self.bearing = (self.bearing + rssi_diff * 5) % 360
         
-        # Add to history
-        self.target_history.append({
-            'time': time.time(),
-            'rssi': rssi,
-            'distance': self.rssi_to_distance(rssi),
-            'bearing': self.bearing
-        })
-        
-        # Keep history limited
-        if len(self.target_history) > 20:
-            self.target_history.pop(0)
+        # Add to history, overwriting the oldest entry once full
+        self._hist_rssi[idx] = rssi
+        self._hist_dist[idx] = int(self.rssi_to_distance(rssi) * 10)
+        self._hist_bear[idx] = int(self.bearing)
+        self._hist_time[idx] = time.ticks_ms()
+        self._hist_idx = (idx + 1) % HISTORY_LEN
+        if self._hist_len < HISTORY_LEN:
+            self._hist_len += 1
         
         # Audio feedback if enabled
         if self.audio_enabled:
             self.play_tone(rssi)
     
+    def read_key(self, timeout_ms=50):
+        """Wait up to timeout_ms for a key; return it lowercased or None"""
+        term = getattr(picocalc, 'terminal', None)
+        if term:
+            count = term.readinto(self.key_buffer)
+            if not count:
+                time.sleep_ms(timeout_ms)
+                return None
+            if count != 1:
+                return None  # Escape sequence (arrows etc.)
+            key = self.key_buffer[0]
+        else:
+            if not self._poll.poll(timeout_ms):
+                return None
+            ch = sys.stdin.read(1)
+            if not ch:
+                return None
+            key = ord(ch)
+        return chr(key).lower() if key < 128 else None
+    
+    def clear_history(self):
+        """Reset target history ring buffer"""
+        self._hist_idx = 0
+        self._hist_len = 0
+        self._kf_x = None
+    
     def play_tone(self, rssi):
         """Play audio tone based on signal strength"""
         if not self.audio:
@@ -142,11 +303,11 @@ class FoxHuntLite:
         except:
             pass
     
-    def start_scan(self):
+    def start_scan(self, interval_us=SCAN_INTERVAL_US, window_us=SCAN_WINDOW_US):
         """Start continuous BLE scanning"""
         try:
             self.scanning = True
-            self.ble.gap_scan(0, 30000, 30000)  # Continuous scan
+            self.ble.gap_scan(0, interval_us, window_us)  # Continuous scan
             print("Scanning started...")
         except Exception as e:
             print(f"Scan error: {e}")
@@ -156,20 +317,15 @@ class FoxHuntLite:
         """Stop BLE scanning"""
         try:
             self.scanning = False
-            self.ble.gap_scan(None)
-            # Force stop
-            self.ble.active(False)
-            time.sleep_ms(50)
-            self.ble.active(True)
-            time.sleep_ms(50)
+            self.ble.gap_scan(None)  # NimBLE stops cleanly, no stack restart
         except:
             pass
     
     def show_scan_results(self):
-        """Display scan results in text mode"""
+        """Display scan results in text mode, returning them sorted by RSSI"""
         if not self.devices:
             print("No devices found")
-            return
+            return []
         
         print(f"\n=== Found {len(self.devices)} devices ===")
         print("    MAC        RSSI  Dist   Name")
@@ -183,7 +339,9 @@ class FoxHuntLite:
             name = data['name'][:12] if data['name'] else "[No name]"
             # Highlight strongest with asterisk
             mark = "*" if i == 1 else " "
-            print(f"{i:2}{mark} {mac[-8:]}  {data['rssi']:3}dBm {data['distance']:4.1f}m  {name}")
+            print(f"{i:2}{mark} {_fmt_mac(mac)[-8:]}  {data['rssi']:3}dBm {data['distance']:4.1f}m  {name}")
+        
+        return sorted_devs
     
     def select_target(self):
         """Select target for tracking"""
@@ -191,7 +349,7 @@ class FoxHuntLite:
             print("No devices to track")
             return False
         
-        self.show_scan_results()
+        sorted_devs = self.show_scan_results()
         
         try:
             choice = input("\nSelect device to track (1-10, 0=cancel): ").strip()
@@ -199,15 +357,13 @@ class FoxHuntLite:
                 return False
             
             idx = int(choice) - 1
-            sorted_devs = sorted(self.devices.items(), 
-                               key=lambda x: x[1]['rssi'], reverse=True)
             
             if 0 <= idx < len(sorted_devs) and idx < 10:
                 self.target_mac = sorted_devs[idx][0]
                 self.target_name = sorted_devs[idx][1]['name']
                 self.mode = "HUNT"
-                self.target_history.clear()
-                print(f"\nTracking: {self.target_mac}")
+                self.clear_history()
+                print(f"\nTracking: {_fmt_mac(self.target_mac)}")
                 return True
         except:
             pass
@@ -218,18 +374,19 @@ class FoxHuntLite:
     def show_hunt_display(self):
         """Show hunting mode display"""
         print("\n" + "=" * 45)
-        print(f"HUNTING: {self.target_name or self.target_mac[-8:]}")
+        print(f"HUNTING: {self.target_name or _fmt_mac(self.target_mac)[-8:]}")
         print("=" * 45)
         
         if self.target_mac in self.devices:
             data = self.devices[self.target_mac]
             
-            # Signal strength bar
-            signal_pct = max(0, min(100, (data['rssi'] + 100) * 2))
-            bar_len = signal_pct // 5
-            signal_bar = "#" * bar_len + "-" * (20 - bar_len)
+            # Signal strength bar: 0..20 cells from -100..-50 dBm
+            bar_len = max(0, min(20, (data['rssi'] + 100) * 2 // 5))
+            bar = self._bar
+            for i in range(20):
+                bar[i] = 0x23 if i < bar_len else 0x2D  # '#' / '-'
             
-            print(f"Signal: [{signal_bar}] {data['rssi']}dBm")
+            print(f"Signal: [{bar.decode()}] {data['rssi']}dBm")
             print(f"Distance: ~{data['distance']:.1f} meters")
             
             # Direction indicator (simple compass)
@@ -238,8 +395,10 @@ class FoxHuntLite:
             print(f"Direction: {directions[dir_idx]} ({int(self.bearing)}°)")
             
             # Trend indicator
-            if len(self.target_history) >= 2:
-                trend = self.target_history[-1]['rssi'] - self.target_history[-2]['rssi']
+            if self._hist_len >= 2:
+                idx = self._hist_idx
+                trend = (self._hist_rssi[(idx - 1) % HISTORY_LEN] -
+                         self._hist_rssi[(idx - 2) % HISTORY_LEN])
                 if trend > 1:
                     print("Trend: Getting STRONGER +++")
                 elif trend < -1:
@@ -256,9 +415,10 @@ class FoxHuntLite:
         print("\nControls: S=Stop hunt, A=Toggle audio, Q=Quit")
     
     def run_scan_mode(self):
-        """Run scanning mode"""
+        """Run scanning mode, returning devices sorted by RSSI"""
         self.mode = "SCAN"
         self.devices.clear()
+        self.reset_adv()
         
         print("\n=== SCAN MODE ===")
         print("Scanning for BLE devices...")
@@ -266,25 +426,44 @@ class FoxHuntLite:
         
         self.start_scan()
         
-        start_time = time.time()
-        last_update = 0
+        start_ticks = time.ticks_ms()
+        last_update = time.ticks_add(start_ticks, -2001)
+        sorted_devs = []
         
         while self.mode == "SCAN":
+            self.drain_adv()
+            now = time.ticks_ms()
             # Update display every 2 seconds
-            if time.time() - last_update > 2:
+            if time.ticks_diff(now, last_update) > 2000:
                 print(f"\rFound {len(self.devices)} devices... ", end="")
-                last_update = time.time()
+                last_update = now
             
             # Auto-show results after 10 seconds
-            if time.time() - start_time > 10 and len(self.devices) > 0:
-                self.show_scan_results()
+            if time.ticks_diff(now, start_ticks) > 10000 and len(self.devices) > 0:
+                sorted_devs = self.show_scan_results()
                 break
             
-            # Check for key press (non-blocking would be better)
-            # For now, we'll use a timeout
-            time.sleep(0.1)
+            key = self.read_key()
+            if key == "q":
+                print()
+                break
+            elif key == "r":
+                print("\nRescanning...")
+                self.devices.clear()
+                self.reset_adv()
+                start_ticks = now
+            elif key == "h" and self.devices:
+                # Hunt the strongest device seen so far
+                self.drain_adv()
+                sorted_devs = self.show_scan_results()
+                strongest = sorted_devs[0]
+                self.target_mac = strongest[0]
+                self.target_name = strongest[1]['name']
+                self.clear_history()
+                self.mode = "HUNT"
         
         self.stop_scan()
+        return sorted_devs
     
     def run_hunt_mode(self):
         """Run hunting mode"""
@@ -292,20 +471,26 @@ class FoxHuntLite:
             print("No target selected")
             return
         
-        print(f"\nStarting hunt for {self.target_name or self.target_mac}")
-        self.start_scan()
+        print(f"\nStarting hunt for {self.target_name or _fmt_mac(self.target_mac)}")
+        self.reset_adv()
+        self.start_scan(HUNT_INTERVAL_US, HUNT_WINDOW_US)
         
-        last_display = 0
+        last_display = time.ticks_add(time.ticks_ms(), -1001)
         
         while self.mode == "HUNT":
+            self.drain_adv()
+            now = time.ticks_ms()
             # Update display every second
-            if time.time() - last_display > 1:
-                # Clear screen (simple method)
-                print("\n" * 50)
+            if time.ticks_diff(now, last_display) > 1000:
+                print(_CLEAR_SCREEN, end="")
                 self.show_hunt_display()
-                last_display = time.time()
+                last_display = now
             
-            time.sleep(0.1)
+            key = self.read_key()
+            if key == "s" or key == "q":
+                self.mode = "SCAN"
+            elif key == "a":
+                self.toggle_audio()
         
         self.stop_scan()
     
@@ -322,27 +507,26 @@ class FoxHuntLite:
     def log_results(self):
         """Log scan results"""
         try:
-            # Ensure log directory exists
-            try:
-                os.listdir("/sd/logs")
-            except:
-                os.mkdir("/sd/logs")
+            ensure_log_dir()
             
-            with open(LOG_FILE, "a") as f:
-                f.write(f"\n=== Fox Hunt Log {time.time()} ===\n")
-                
-                if self.target_mac and self.target_history:
-                    latest = self.target_history[-1]
-                    f.write(f"Target: {self.target_name} ({self.target_mac})\n")
-                    f.write(f"Last RSSI: {latest['rssi']}dBm\n")
-                    f.write(f"Distance: {latest['distance']}m\n")
-                    f.write(f"Bearing: {latest['bearing']}°\n")
-                    f.write(f"History points: {len(self.target_history)}\n")
-                else:
-                    f.write(f"Devices found: {len(self.devices)}\n")
-                    for mac, data in sorted(self.devices.items(), 
-                                          key=lambda x: x[1]['rssi'], reverse=True)[:5]:
-                        f.write(f"{mac}: {data['rssi']}dBm, {data['name']}\n")
+            # Build the entry in RAM and write it with a single call
+            parts = [f"\n=== Fox Hunt Log {time.time()} ===\n"]
+            
+            if self.target_mac and self._hist_len:
+                last = (self._hist_idx - 1) % HISTORY_LEN
+                parts.append(f"Target: {self.target_name} ({_fmt_mac(self.target_mac)})\n")
+                parts.append(f"Last RSSI: {self._hist_rssi[last]}dBm\n")
+                parts.append(f"Distance: {self._hist_dist[last] / 10}m\n")
+                parts.append(f"Bearing: {self._hist_bear[last]}°\n")
+                parts.append(f"History points: {self._hist_len}\n")
+            else:
+                parts.append(f"Devices found: {len(self.devices)}\n")
+                for mac, data in sorted(self.devices.items(), 
+                                      key=lambda x: x[1]['rssi'], reverse=True)[:5]:
+                    parts.append(f"{_fmt_mac(mac)}: {data['rssi']}dBm, {data['name']}\n")
+            
+            with open(LOG_FILE, "ab") as f:
+                f.write("".join(parts).encode("utf-8"))
             
             print("Results logged")
         except Exception as e:
@@ -374,16 +558,18 @@ def main_menu():
         
         if choice == "1":
             scanner.run_scan_mode()
+            if scanner.mode == "HUNT":  # H pressed during scan
+                scanner.run_hunt_mode()
             
         elif choice == "2":
-            scanner.run_scan_mode()
-            if scanner.devices:
+            sorted_devs = scanner.run_scan_mode()
+            if sorted_devs:
                 # Auto-select strongest
-                strongest = max(scanner.devices.items(), 
-                              key=lambda x: x[1]['rssi'])
+                strongest = sorted_devs[0]
                 scanner.target_mac = strongest[0]
                 scanner.target_name = strongest[1]['name']
                 scanner.mode = "HUNT"
+                scanner.clear_history()
                 scanner.run_hunt_mode()
             
         elif choice == "3":
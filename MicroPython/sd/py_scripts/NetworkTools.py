@@ -4,6 +4,15 @@ Manages memory efficiently by running one tool at a time
 """
 
 import gc
+import sys
+
+# Menu choice -> (module name, launch message)
+TOOLS = {
+    "1": ("WiFiManager", "WiFi Manager"),
+    "2": ("ProxiScan_compact", "BLE Scanner (Compact)"),
+    "3": ("FoxHunt_lite", "Fox Hunt Lite"),
+    "4": ("FoxHunt_competition", "Fox Hunt Competition"),
+}
 
 def show_menu():
     """Show main menu"""
@@ -42,6 +51,20 @@ def ntp_sync():
             pass
         gc.collect()
 
+def run_tool(name, label):
+    """Import a tool module, run its main() and unload it again"""
+    try:
+        print(f"\nLaunching {label}...")
+        mod = __import__(name)
+        mod.main()
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        # Drop the module from sys.modules so its memory can be reclaimed
+        sys.modules.pop(name, None)
+        mod = None
+        gc.collect()
+
 def main():
     """Main launcher"""
     while True:
@@ -50,76 +73,12 @@ def main():
         
         choice = show_menu()
         
-        if choice == "1":
-            try:
-                print("\nLaunching WiFi Manager...")
-                import WiFiManager
-                WiFiManager.main()
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                # Clean up
-                try:
-                    del WiFiManager
-                except:
-                    pass
-                gc.collect()
-                
-        elif choice == "2":
-            try:
-                print("\nLaunching BLE Scanner (Compact)...")
-                import ProxiScan_compact
-                ProxiScan_compact.main()
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                # Clean up
-                try:
-                    del ProxiScan_compact
-                except:
-                    pass
-                gc.collect()
-                
-        elif choice == "3":
-            try:
-                print("\nLaunching Fox Hunt Lite...")
-                import FoxHunt_lite
-                FoxHunt_lite.main()
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                # Clean up
-                try:
-                    del FoxHunt_lite
-                except:
-                    pass
-                gc.collect()
-                
-        elif choice == "4":
-            try:
-                print("\nLaunching Fox Hunt Competition...")
-                import FoxHunt_competition
-                FoxHunt_competition.main()
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                # Clean up
-                try:
-                    del FoxHunt_competition
-                except:
-                    pass
-                gc.collect()
+        if choice in TOOLS:
+            run_tool(*TOOLS[choice])
                 
         elif choice == "5":
-            try:
-                print("\nLaunching Fox Hunt Pro (Graphics)...")
-                print("Note: This requires more memory")
-                # Use exec to avoid import issues with dots
-                exec(open('/sd/py_scripts/ProxiScan_3.0.py').read())
-            except Exception as e:
-                print(f"Error: {e}")
-            finally:
-                gc.collect()
+            print("\nNote: Fox Hunt Pro requires more memory")
+            run_tool("ProxiScan3", "Fox Hunt Pro (Graphics)")
                 
         elif choice == "6":
             ntp_sync()
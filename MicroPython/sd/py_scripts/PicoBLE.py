@@ -7,13 +7,16 @@ import picocalc
 import time
 import os
 import gc
+import errno
 import struct
+import micropython
 from micropython import const
 
 from picocalc import PicoKeyboard   # ← pull in the keyboard API
 
 # create one global keyboard instance
 kbd = PicoKeyboard()
+_key_buf = bytearray(1)  # Reused by every keyboard poll
 
 # Import necessary BLE modules
 try:
@@ -23,12 +26,17 @@ except ImportError:
     raise ImportError("Bluetooth module not found")
 
 # Configuration settings
-DEBUG_MODE = True   # Enable for transfer debugging
-CHUNK_SIZE = 200    # Maximum BLE packet size for optimal performance
-MAX_RETRIES = 5     # Number of retries for operations
-ACK_TIMEOUT_MS = 1000  # Timeout for waiting for acknowledgments
-FLOW_CONTROL_DELAY_MS = 10  # Delay between chunks to prevent overflow
-MAX_PENDING_CHUNKS = 3  # Maximum chunks to send before requiring ACK
+DEBUG_MODE = const(False)  # const(True) for transfer debugging
+ATT_MTU_MAX = const(247)  # Largest ATT MTU we offer during MTU exchange
+DEFAULT_CHUNK_SIZE = const(20)  # Payload of the default 23-byte ATT MTU
+CHUNK_SIZE = DEFAULT_CHUNK_SIZE  # Notify payload, raised to MTU - 3 on exchange
+MAX_RETRIES = const(5)     # Number of retries for operations
+ACK_TIMEOUT_MS = const(1000)  # Timeout for waiting for acknowledgments
+PROGRESS_INTERVAL_MS = const(250)  # Minimum time between progress redraws
+MEM_SAMPLE_MS = const(1000)  # Minimum time between gc.mem_free() samples
+ACK_WINDOW = const(16)  # File data chunks per ACK, advertised in the FILE_INFO reply
+IDLE_LOOP_MS = const(50)  # Main loop period while advertising (idle animation)
+CONNECTED_LOOP_MS = const(250)  # Main loop period while connected (IRQs do the work)
 
 # Define constants for BLE operation
 def get_device_name():
@@ -36,7 +44,11 @@ def get_device_name():
     suffix = ''.join('%02X' % b for b in mac[-2:])
     return f"PicoCalc_{suffix}"
 
-_ADV_INTERVAL_MS = const(250)
+_ADV_INTERVAL_MS = const(20)  # Short interval: the central finds us quickly
+# Preferred connection interval, 1.25 ms units (7.5-15 ms), advertised to the
+# central; its default of ~50 ms caps how often a chunk can be exchanged
+CONN_INTERVAL_MIN = const(6)
+CONN_INTERVAL_MAX = const(12)
 
 
 # Command codes
@@ -56,6 +68,7 @@ CMD_FLOW_CONTROL = const(10) # Flow control command
 _IRQ_CENTRAL_CONNECT = const(1)
 _IRQ_CENTRAL_DISCONNECT = const(2)
 _IRQ_GATTS_WRITE = const(3)
+_IRQ_MTU_EXCHANGED = const(21)
 
 # UUIDs for the Nordic UART Service (NUS)
 _NUS_UUID = bluetooth.UUID("6E400001-B5A3-F393-E0A9-E50E24DCCA9E")
@@ -76,12 +89,51 @@ services = None
 rx_handle = None
 tx_handle = None
 shutdown_requested = False  # Flag to indicate shutdown
+_adv_payload = None  # Built once in init_bluetooth, reused on every re-advertise
+_scan_resp = None
 
 # File transfer state
 current_file = None
 current_path = ""
+current_dir = ""  # current_path split once when the file is opened
+current_name = ""
 bytes_received = 0
 
+# Directories known to exist, so repeat uploads skip the SD lookups
+# (the card root always does)
+_known_dirs = set(("/sd",))
+
+# Incoming file data is staged here and written out in 4 KB blocks (8 SD
+# sectors, one FAT cluster on most cards) so each write covers whole clusters
+WRITE_BUF_SIZE = const(4096)
+_write_buf = bytearray(WRITE_BUF_SIZE)
+_write_mv = memoryview(_write_buf)
+_write_len = 0
+_chunks_since_ack = 0  # FILE_DATA chunks received since the last ACK
+
+# Directory listings are built here; allocated once and kept for the whole
+# session so repeated listings do not fragment the heap
+LISTING_BUF_SIZE = const(2048)
+_listing_buf = bytearray(LISTING_BUF_SIZE)
+
+# Scratch buffer for status notifications, reused for every response
+_resp = bytearray(8)
+_resp_mv = memoryview(_resp)
+_resp_status = _resp_mv[:2]  # [command, status]
+_resp_count = _resp_mv[:6]  # [command, status, bytes received (<I)]
+
+# Fixed success replies, built once and notified as-is
+_ACK_FILE_INFO = bytes((CMD_FILE_INFO, 0, ACK_WINDOW))  # 3rd byte: ACK window
+
+# Ring of RX slots filled by ble_irq and drained by a scheduled task, so
+# commands (SD writes, redraws, listings) never run in the IRQ handler
+RX_SLOTS = const(ACK_WINDOW + 4)  # A full unacknowledged window plus commands
+_rx_bufs = [bytearray(ATT_MTU_MAX) for _ in range(RX_SLOTS)]
+_rx_lens = [0] * RX_SLOTS
+_rx_rd = 0
+_rx_wr = 0
+_rx_scheduled = False
+
 # Default upload directory for Python scripts
 DEFAULT_SCRIPT_DIR = "/sd/py_scripts"
 
@@ -99,54 +151,80 @@ COLOR_SUCCESS = COLOR_WHITE
 COLOR_ERROR = COLOR_GRAY
 
 # Activity indicator
+_ACTIVITY_FRAMES = ("...", ". .", ".. ", ".  ")
 activity_dots = 0
 activity_color = COLOR_SUCCESS
 next_activity_update = 0
 
+# Free memory shown on screen, sampled at most every MEM_SAMPLE_MS
+_mem_kb = 0
+_next_mem = 0
+
 # Exit flag for keyboard interrupt
 want_exit = False
 
+# Set once the static parts of the progress screen are on the display
+_progress_drawn = False
+_next_ui = 0  # ticks_ms deadline for the next progress redraw
+_progress_dirty = False  # Set per chunk; the main loop does the redraw
+# Set once the "Connected" screen is up; later frames only touch the title
+_connected_drawn = False
+# Set once the status screen's fixed labels and footer are on the display;
+# the display buffer itself keeps them, so later messages skip redrawing them
+_status_drawn = False
+
 # artsy bouncing-square + breathing-bar idle indicator
 idle_frame = 0
+# Set once the idle screen has been cleared; later frames only touch what moves
+_idle_drawn = False
+_idle_prev_x = 0
+_idle_prev_col = -1
 def show_idle():
-    global idle_frame
+    global idle_frame, _progress_drawn, _idle_drawn, _idle_prev_x, _idle_prev_col, _connected_drawn, _status_drawn
     d = picocalc.display
     if not d or shutdown_requested:
         return
-    d.fill(COLOR_BLACK)
+    if not _idle_drawn:
+        d.fill(COLOR_BLACK)
+        _progress_drawn = False
+        _connected_drawn = False
+        _status_drawn = False
+        _idle_drawn = True
+        _idle_prev_col = -1
+    else:
+        # Erase last frame's square
+        d.fill_rect(10 + _idle_prev_x, 20, 12, 12, COLOR_BLACK)
     # 1) Bouncing red square across the top
     span = 200
     x = idle_frame % (span * 2)
     if x > span:
         x = 2 * span - x
     d.fill_rect(10 + x, 20, 12, 12, COLOR_LIGHT_GRAY)
-    # 2) Breathing cyan bar underneath
+    _idle_prev_x = x
+    # 2) Breathing cyan bar underneath (blank the rest of its 80px track)
     bar_w = ((idle_frame % 20) * 4) + 4
     d.fill_rect(10, 50, bar_w, 4, COLOR_GRAY)
-    # 3) Flickering “Ready” text that swaps red/green
+    d.fill_rect(10 + bar_w, 50, 80 - bar_w, 4, COLOR_BLACK)
+    # 3) Flickering “Ready” text that swaps red/green, redrawn on change only
     col = COLOR_WHITE if (idle_frame % 10) < 5 else COLOR_LIGHT_GRAY
-    d.text("Ready", 10, 100, col)
+    if col != _idle_prev_col:
+        d.text("Ready", 10, 100, col)
+        _idle_prev_col = col
     d.show()
     idle_frame += 1
 
 def debug_print(message):
     """Print debug messages only if DEBUG_MODE is enabled"""
-    if DEBUG_MODE and not shutdown_requested:
-        print("[DEBUG] " + message)
+    # DEBUG_MODE is const, so the compiler drops this branch when it is off;
+    # hot call sites wrap the call in the same test to skip the f-string too
+    if DEBUG_MODE:
+        if not shutdown_requested:
+            print("[DEBUG] " + message)
 
 def get_activity_indicator():
     """Get activity indicator string"""
-    global activity_dots
-    if activity_dots == 0:
-        return "..."
-    elif activity_dots == 1:
-        return ". ."
-    elif activity_dots == 2:
-        return ".. "
-    elif activity_dots == 3:
-        return ".  "
-    else:
-        return "  ."
+    # activity_dots cycles 0-3 (update_activity wraps it), always in range
+    return _ACTIVITY_FRAMES[activity_dots]
 
 def update_activity():
     """Update activity indicator"""
@@ -156,16 +234,40 @@ def update_activity():
         next_activity_update = now + 200  # Update every 200ms
         activity_dots = (activity_dots + 1) % 4
 
+def free_kb():
+    """Free heap in KB, resampled only when the cached value is stale"""
+    global _mem_kb, _next_mem
+    # gc.mem_free() walks the heap, too slow to repeat on every redraw
+    now = time.ticks_ms()
+    if time.ticks_diff(now, _next_mem) >= 0:
+        _mem_kb = gc.mem_free() // 1024
+        _next_mem = time.ticks_add(now, MEM_SAMPLE_MS)
+    return _mem_kb
+
 def update_display(message, color=None, show_activity=False, clear=True):
     """Update display with status message and visual feedback"""
-    global activity_color
+    global activity_color, _progress_drawn, _idle_drawn, _connected_drawn, _status_drawn
     
-    if not picocalc.display or shutdown_requested:
+    d = picocalc.display
+    if not d or shutdown_requested:
         return
         
-    if clear:
-        # Clear display
-        picocalc.display.fill(COLOR_BLACK)
+    if clear and _status_drawn:
+        # Keep the fixed labels and footer; clear the title, message and
+        # status rows, and the memory figure
+        d.fill_rect(0, 0, d.width, 250, COLOR_BLACK)
+        d.fill_rect(58, 260, d.width - 58, 8, COLOR_BLACK)
+    else:
+        if clear:
+            # Clear display
+            d.fill(COLOR_BLACK)
+        # Static parts: memory label and instructions
+        d.text("Memory:", 10, 260, COLOR_GRAY)
+        d.text("Press ESC to exit", 10, 280, COLOR_ERROR)
+        _status_drawn = clear
+    _progress_drawn = False  # Progress screen needs a full redraw
+    _idle_drawn = False  # So does the idle screen
+    _connected_drawn = False  # And the connected screen
     
     # Update activity if needed
     if show_activity:
@@ -176,9 +278,9 @@ def update_display(message, color=None, show_activity=False, clear=True):
         if color:
             activity_color = color
         indicator = get_activity_indicator()
-        picocalc.display.text(f"BLE File Transfer {indicator}", 10, 10, activity_color)
+        d.text(f"BLE File Transfer {indicator}", 10, 10, activity_color)
     else:
-        picocalc.display.text("BLE File Transfer", 10, 10, COLOR_WHITE)
+        d.text("BLE File Transfer", 10, 10, COLOR_WHITE)
     
     # Split message lines
     if message:
@@ -186,116 +288,225 @@ def update_display(message, color=None, show_activity=False, clear=True):
         y = 40
         for line in lines:
             display_color = color if color else COLOR_WHITE
-            picocalc.display.text(line, 20, y, display_color)
+            d.text(line, 20, y, display_color)
             y += 20
     
     # Show info
     if is_connected:
-        picocalc.display.text("Status: Connected", 10, 240, COLOR_SUCCESS)
+        d.text("Status: Connected", 10, 240, COLOR_SUCCESS)
     else:
-        picocalc.display.text("Status: Waiting for connection", 10, 240, COLOR_TRANSFER)
+        d.text("Status: Waiting for connection", 10, 240, COLOR_TRANSFER)
     
-    # Memory info
-    free_mem = gc.mem_free()
-    picocalc.display.text(f"Memory: {free_mem // 1024}K free", 10, 260, COLOR_GRAY)
-    
-    # Instructions
-    picocalc.display.text("Press ESC to exit", 10, 280, COLOR_ERROR)
+    # Memory figure, after the "Memory:" label
+    d.text(f"{free_kb()}K free", 58, 260, COLOR_GRAY)
     
     # Show the display
-    picocalc.display.show()
+    d.show()
 
-def update_display_progress():
-    """Update display with progress bar"""
-    if not picocalc.display or shutdown_requested:
+def show_connected():
+    """Show the connected screen, redrawing only the title once it is up"""
+    global _connected_drawn
+    
+    d = picocalc.display
+    if not d or shutdown_requested:
         return
     
-    # Clear display
-    picocalc.display.fill(COLOR_BLACK)
+    if not _connected_drawn:
+        update_display("Connected", color=0x07E0, show_activity=True)
+        _connected_drawn = True
+        return
     
-    # Title with activity indicator
+    # Only the activity indicator moves; skip the frame if it has not
+    prev = activity_dots
     update_activity()
-    indicator = get_activity_indicator()
-    picocalc.display.text(f"File Transfer {indicator}", 10, 10, COLOR_TRANSFER)
+    if activity_dots == prev:
+        return
+    d.fill_rect(10, 10, 300, 8, COLOR_BLACK)
+    d.text(f"BLE File Transfer {get_activity_indicator()}", 10, 10, activity_color)
+    d.show()
+
+def update_display_progress():
+    """Update display with progress bar, redrawing only what changed"""
+    global _progress_drawn, _idle_drawn, _connected_drawn, _status_drawn
     
-    # File info
-    filename = current_path.split('/')[-1]
-    picocalc.display.text(f"File: {filename[:20]}", 10, 40, COLOR_WHITE)
-    picocalc.display.text(f"Bytes: {bytes_received}", 10, 60, COLOR_WHITE)
+    d = picocalc.display
+    if not d or shutdown_requested:
+        return
     
-    # Progress bar
+    # Progress bar geometry
     bar_x = 20
     bar_y = 100
     bar_width = 280
     bar_height = 30
     
-    # Draw border
-    picocalc.display.rect(bar_x, bar_y, bar_width, bar_height, COLOR_WHITE)
+    if not _progress_drawn:
+        # Static parts: drawn once per transfer
+        d.fill(COLOR_BLACK)
+        _idle_drawn = False
+        _connected_drawn = False
+        _status_drawn = False
+        
+        # File info
+        d.text(f"File: {current_name[:20]}", 10, 40, COLOR_WHITE)
+        
+        # Labels for the figures updated below
+        d.text("Bytes:", 10, 60, COLOR_WHITE)
+        d.text("Memory:", 10, 180, COLOR_GRAY)
+        
+        # Draw border
+        d.rect(bar_x, bar_y, bar_width, bar_height, COLOR_WHITE)
+        
+        # Instructions
+        d.text("Press ESC to cancel", 10, 280, COLOR_ERROR)
+        
+        # Show target directory
+        if current_dir.startswith(DEFAULT_SCRIPT_DIR):
+            d.text("Target: py_scripts", 10, 200, COLOR_SUCCESS)
+        
+        _progress_drawn = True
+    
+    # Title with activity indicator
+    update_activity()
+    indicator = get_activity_indicator()
+    d.fill_rect(10, 10, 300, 8, COLOR_BLACK)
+    d.text(f"File Transfer {indicator}", 10, 10, COLOR_TRANSFER)
+    
+    # Figures only; their labels are part of the static layer (6 px glyphs)
+    d.fill_rect(52, 60, 258, 8, COLOR_BLACK)
+    d.text(str(bytes_received), 52, 60, COLOR_WHITE)
     
     # Draw progress (adapt max visual based on file size)
     max_visual = max(100 * 1024, bytes_received * 1.2)  # Dynamic scale based on current size
     progress = min(1.0, bytes_received / max_visual)
     fill_width = int(progress * (bar_width - 4))
+    d.fill_rect(bar_x + 2, bar_y + 2, bar_width - 4, bar_height - 4, COLOR_BLACK)
     if fill_width > 0:
-        picocalc.display.fill_rect(bar_x + 2, bar_y + 2, fill_width, bar_height - 4, COLOR_SUCCESS)
+        d.fill_rect(bar_x + 2, bar_y + 2, fill_width, bar_height - 4, COLOR_SUCCESS)
     
     # Progress percentage
     percent = min(100, int(progress * 100))
-    picocalc.display.text(f"{percent}%", bar_x + bar_width // 2 - 10, bar_y + bar_height + 10, COLOR_WHITE)
+    text_y = bar_y + bar_height + 10
+    d.fill_rect(bar_x, text_y, bar_width, 8, COLOR_BLACK)
+    d.text(f"{percent}%", bar_x + bar_width // 2 - 10, text_y, COLOR_WHITE)
     
     # Memory info
-    free_mem = gc.mem_free()
-    picocalc.display.text(f"Memory: {free_mem // 1024}K free", 10, 180, COLOR_GRAY)
-    
-    # Instructions
-    picocalc.display.text("Press ESC to cancel", 10, 280, COLOR_ERROR)
-    
-    # Show target directory
-    if current_path.startswith(DEFAULT_SCRIPT_DIR):
-        picocalc.display.text("Target: py_scripts", 10, 200, COLOR_SUCCESS)
+    d.fill_rect(58, 180, 252, 8, COLOR_BLACK)
+    d.text(f"{free_kb()}K free", 58, 180, COLOR_GRAY)
     
     # Show the display
-    picocalc.display.show()
+    d.show()
+
+def path_leaf(path):
+    """Return the last path component (like path.split('/')[-1])"""
+    return path[path.rfind('/') + 1:]
+
+def path_dir(path):
+    """Return everything before the last '/' ('' if there is none)"""
+    i = path.rfind('/')
+    return path[:i] if i > 0 else ""
+
+def sd_path(path):
+    """Return path rooted under /sd"""
+    if path.startswith("/sd"):
+        return path
+    return "/sd/" + (path[1:] if path.startswith("/") else path)
 
 def ensure_directory_exists(path):
     """Ensure all directories in path exist (but not the file itself)"""
     # Extract directory part - everything except the filename
-    directory_path = '/'.join(path.split('/')[:-1])
+    directory_path = path_dir(path)
     
     # If no directory part, nothing to create
     if not directory_path or directory_path == path:
         return
     
     # Make sure it starts with /sd
-    if not directory_path.startswith("/sd"):
-        directory_path = "/sd/" + directory_path.lstrip('/')
-    
-    # Create directory structure
-    parts = directory_path.split('/')
-    current = ""
-    for part in parts:
-        if not part:  # Skip empty parts (like after initial /)
-            continue
-        
-        current = current + "/" + part if current else "/" + part
+    directory_path = sd_path(directory_path)
+    
+    if directory_path in _known_dirs:
+        return
+    
+    # Common case: the leaf already exists, one stat is enough
+    try:
+        os.stat(directory_path)
+        _known_dirs.add(directory_path)
+        return
+    except OSError:
+        pass
+    
+    # Create directory structure: each ancestor is a prefix slice ending
+    # at the next '/', so no component list or concatenation is built
+    i = directory_path.find('/', 1)
+    while True:
+        current = directory_path[:i] if i >= 0 else directory_path
         
-        # Skip if this is sd (already exists)
-        if current == "/sd":
-            continue
-            
-        try:
-            os.stat(current)  # Check if exists
-        except OSError:
+        # Skip ancestors already known to exist (including /sd itself)
+        if current not in _known_dirs:
             try:
-                os.mkdir(current)
-                debug_print(f"Created directory: {current}")
-            except Exception as e:
-                debug_print(f"Error creating directory {current}: {e}")
-                raise
+                os.stat(current)  # Check if exists
+            except OSError:
+                try:
+                    os.mkdir(current)
+                    debug_print(f"Created directory: {current}")
+                except Exception as e:
+                    debug_print(f"Error creating directory {current}: {e}")
+                    raise
+            _known_dirs.add(current)
+        
+        if i < 0:
+            break
+        i = directory_path.find('/', i + 1)
+    
+    _known_dirs.add(directory_path)
+
+def forget_directory(path):
+    """Drop path and its subdirectories from the known-directory cache"""
+    prefix = path + "/"
+    for d in [d for d in _known_dirs if d == path or d.startswith(prefix)]:
+        _known_dirs.discard(d)
+
+@micropython.native
+def buffer_file_data(data):
+    """Stage data in the write buffer, writing it out each time it fills
+
+    data is a memoryview (see _do_file_data), so slicing it never copies.
+    """
+    global _write_len
+    
+    n = len(data)
+    buf_len = _write_len  # Work on a local, store the global once at the end
+    
+    # Common case: the chunk fits without filling the buffer; one copy and
+    # no intermediate views
+    if buf_len + n < WRITE_BUF_SIZE:
+        _write_mv[buf_len:buf_len + n] = data
+        _write_len = buf_len + n
+        return
+    
+    pos = 0
+    while pos < n:
+        take = min(WRITE_BUF_SIZE - buf_len, n - pos)
+        _write_mv[buf_len:buf_len + take] = data[pos:pos + take]
+        buf_len += take
+        pos += take
+        if buf_len == WRITE_BUF_SIZE:
+            # No flush here: syncing rewrites the FAT and directory entry,
+            # close() in end_file_transfer does that once per file
+            current_file.write(_write_buf)
+            buf_len = 0
+    _write_len = buf_len
+
+def flush_file_data():
+    """Write any partially filled buffer to the file"""
+    global _write_len
+    
+    if _write_len:
+        current_file.write(_write_mv[:_write_len])
+        _write_len = 0
 
 def cleanup_transfer():
     """Clean up file transfer state"""
-    global current_file, current_path, bytes_received
+    global current_file, current_path, current_dir, current_name, bytes_received, _write_len, _chunks_since_ack, _progress_dirty
     
     if current_file:
         try:
@@ -305,20 +516,41 @@ def cleanup_transfer():
         current_file = None
     
     current_path = ""
+    current_dir = ""
+    current_name = ""
     bytes_received = 0
     current_file = None
+    _write_len = 0
+    _chunks_since_ack = 0
+    _progress_dirty = False
     
-    # Run garbage collection to free memory
+    # Transfer over: reclaim its garbage now and re-arm the threshold
     gc.collect()
+    arm_gc_threshold()
+
+def arm_gc_threshold():
+    """Let the runtime collect after a quarter of the free heap is allocated"""
+    # Re-armed after each transfer, whose buffers shift the baseline
+    gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+
+def send_reply(buf):
+    """Store a short fixed-size reply in the TX attribute and push it to the client"""
+    # The stack keeps the attribute value, so no per-call notify copy is made
+    ble.gatts_write(tx_handle, buf, True)
+
+def send_status(command, status=0):
+    """Notify a 2-byte [command, status] response from the scratch buffer"""
+    _resp[0] = command
+    _resp[1] = status
+    send_reply(_resp_status)
 
 def send_error_response(command, message=""):
     """Utility function to send error responses"""
     global conn_handle, tx_handle
     
     debug_print(f"Error response for command {command}: {message}")
-    response = bytearray([command, 0xFF])  # Error
     try:
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        send_status(command, 0xFF)  # Error
     except Exception as e:
         debug_print(f"Failed to send error response: {e}")
 
@@ -330,82 +562,120 @@ def list_directory(path):
     
     try:
         # Ensure path starts with /sd
-        if not path.startswith("/sd"):
-            path = "/sd/" + path.lstrip('/')
+        path = sd_path(path)
             
-        # List directory
-        contents = os.listdir(path)
-        
-        # Build response
-        response = bytearray([CMD_LIST_DIR])  # Command echo
+        # Entry paths share this prefix; build it once, not per entry
+        prefix = path + "/"
+        path_b = path.encode('utf-8')
         
-        # Add path
-        response.extend(path.encode('utf-8'))
-        response.extend(b'\0')  # Null terminator
+        # Write straight into the persistent listing buffer; only a listing
+        # that outgrows it is moved to a larger one-off buffer
+        response = _listing_buf
+        cap = LISTING_BUF_SIZE
+        response[0] = CMD_LIST_DIR  # Command echo
+        off = 1
+        response[off:off + len(path_b)] = path_b
+        off += len(path_b)
+        response[off] = 0  # Null terminator
+        off += 1
         
-        # Add entries
-        for entry in contents:
-            # Check if directory
+        # One directory scan: ilistdir yields (name, type, inode[, size]),
+        # so no per-entry stat is needed, and each name is encoded once and
+        # copied into place without collecting the entries first
+        for item in os.ilistdir(path):
+            entry = item[0]
             try:
-                full_path = f"{path}/{entry}"
-                stat = os.stat(full_path)
-                is_dir = (stat[0] & 0x4000) != 0
-                size = stat[6]
-                
-                # Add entry type (1=dir, 0=file)
-                response.append(1 if is_dir else 0)
-                
-                # Add size (4 bytes, little endian)
-                response.extend(struct.pack("<I", size))
-                
-                # Add name
-                response.extend(entry.encode('utf-8'))
-                response.append(0)  # Null terminator
-                
+                is_dir = 1 if item[1] & 0x4000 else 0
+                if len(item) > 3:
+                    size = item[3]
+                else:
+                    size = os.stat(prefix + entry)[6]  # VFS without sizes
+                name_b = entry.encode('utf-8')
+                end = off + 5 + len(name_b) + 1  # Type + size + name + null
+                if end > cap:
+                    cap = max(cap * 2, end)
+                    grown = bytearray(cap)
+                    grown[:off] = memoryview(response)[:off]
+                    response = grown
+                # Entry type (1=dir, 0=file) + size (4 bytes, little endian)
+                struct.pack_into("<BI", response, off, is_dir, size)
+                off += 5
+                response[off:off + len(name_b)] = name_b
+                off += len(name_b)
+                response[off] = 0  # Null terminator
+                off += 1
             except Exception as e:
                 debug_print(f"Error adding entry {entry}: {e}")
         
         # Send response in chunks
-        send_chunked_data(response)
+        send_chunked_data(memoryview(response)[:off])
         update_display(f"Listed directory: {path}", color=COLOR_SUCCESS, show_activity=True)
         
     except Exception as e:
         debug_print(f"Error listing directory: {e}")
         send_error_response(CMD_LIST_DIR)
 
+@micropython.native
 def send_chunked_data(data):
     """Send response in chunks without sequence numbers for non-file transfers"""
-    global conn_handle, tx_handle
+    # Globals looked up once; the loop below only touches locals
+    notify = ble.gatts_notify
+    ch = conn_handle
+    th = tx_handle
+    size = CHUNK_SIZE
+    total = len(data)
+    ticks_ms = time.ticks_ms
+    sleep_ms = time.sleep_ms
     
-    debug_print(f"Sending {len(data)} bytes in chunks of {CHUNK_SIZE}")
+    if DEBUG_MODE:
+        n_chunks = (total + size - 1) // size  # Once, not per chunk
+        debug_print(f"Sending {total} bytes in {n_chunks} chunks of {size}")
     
-    for i in range(0, len(data), CHUNK_SIZE):
-        chunk = data[i:i+CHUNK_SIZE]
+    mv = memoryview(data)  # Slices below share data's buffer, no copies
+    for i in range(0, total, size):
+        chunk = mv[i:i+size]
         retry_count = 0
+        busy_since = None
+        # Logged once per chunk, outside the ENOMEM wait loop
+        if DEBUG_MODE:
+            debug_print(f"Sending chunk {i//size + 1}/{n_chunks}")
         
         while retry_count < MAX_RETRIES:
             try:
-                debug_print(f"Sending chunk {i//CHUNK_SIZE + 1}/{(len(data) + CHUNK_SIZE - 1)//CHUNK_SIZE}")
-                ble.gatts_notify(conn_handle, tx_handle, chunk)
-                # Small delay between chunks
-                time.sleep_ms(10)
+                notify(ch, th, chunk)
                 break  # Success, exit retry loop
+            except OSError as e:
+                # ENOMEM: the stack's notify queue is full. Wait briefly for
+                # it to drain instead of sleeping after every chunk.
+                if e.args and e.args[0] == errno.ENOMEM:
+                    now = ticks_ms()
+                    if busy_since is None:
+                        busy_since = now
+                    if time.ticks_diff(now, busy_since) < ACK_TIMEOUT_MS:
+                        sleep_ms(2)
+                        continue
+                retry_count += 1
+                debug_print(f"Error sending chunk (attempt {retry_count}): {e}")
+                if retry_count >= MAX_RETRIES:
+                    debug_print("Max retries exceeded, giving up")
+                    return
+                sleep_ms(100 * retry_count)  # Exponential backoff
             except Exception as e:
                 retry_count += 1
                 debug_print(f"Error sending chunk (attempt {retry_count}): {e}")
                 if retry_count >= MAX_RETRIES:
                     debug_print("Max retries exceeded, giving up")
                     return
-                time.sleep_ms(100 * retry_count)  # Exponential backoff
+                sleep_ms(100 * retry_count)  # Exponential backoff
 
 def start_file_transfer(path):
     """Start receiving a file"""
-    global current_file, current_path, bytes_received, conn_handle, tx_handle
+    global current_file, current_path, current_dir, current_name, bytes_received, conn_handle, tx_handle, _chunks_since_ack, _next_ui
     
     # If path is just a filename (no directory), use default script directory
     if '/' not in path or path.startswith('/'):
         # Extract just the filename
-        filename = path.split('/')[-1] if '/' in path else path
+        filename = path_leaf(path)
         # Use default directory
         path = f"{DEFAULT_SCRIPT_DIR}/{filename}"
         debug_print(f"Using default directory: {DEFAULT_SCRIPT_DIR}")
@@ -420,42 +690,36 @@ def start_file_transfer(path):
             return
         
         # Ensure path starts with /sd
-        if not path.startswith("/sd"):
-            path = "/sd/" + path.lstrip('/')
+        path = sd_path(path)
         
-        # Check for existing file/directory and handle appropriately
-        try:
-            stat_result = os.stat(path)
-            is_dir = (stat_result[0] & 0x4000) != 0
-            
-            if is_dir:
-                debug_print(f"Error: Path exists as directory: {path}")
-                send_error_response(CMD_FILE_INFO, "Path is a directory")
-                return
-            else:
-                file_size = stat_result[6]  # Size is at index 6
-                debug_print(f"Found existing file: {path}, size: {file_size} bytes")
-                try:
-                    os.remove(path)
-                    debug_print(f"Successfully removed existing file: {path}")
-                except OSError as e:
-                    debug_print(f"Could not remove existing file ({e}), continuing...")
-        except OSError:
-            debug_print(f"No existing file at {path}")
-            
         # Ensure directory exists
         ensure_directory_exists(path)
         
-        # Open file for writing
+        # Open file for writing. "wb" truncates an existing file in place,
+        # so no separate stat/remove pass; a directory at path makes open
+        # raise, which is reported below as a FILE_INFO error.
         current_file = open(path, "wb")
         current_path = path
+        # Split once here; the progress screen and the rename reuse the parts
+        cut = path.rfind('/')
+        current_dir = path[:cut]
+        current_name = path[cut + 1:]
         bytes_received = 0
+        _chunks_since_ack = 0
+        _next_ui = time.ticks_ms()  # Draw the progress screen on the first chunk
+        
+        # Start from a clean heap. Automatic GC stays on: each chunk still
+        # allocates small objects (the gatts_read value, slot views), and
+        # with it disabled a full heap raises MemoryError instead of
+        # collecting. The threshold keeps those collections infrequent.
+        gc.collect()
         
         # Send response
-        response = bytearray([CMD_FILE_INFO, 0])  # Success
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        # Success; the third byte tells the client how many chunks it may
+        # send before waiting for an ACK
+        send_reply(_ACK_FILE_INFO)
         
-        update_display(f"Receiving file:\n{path.split('/')[-1]}", color=COLOR_TRANSFER, show_activity=True)
+        update_display(f"Receiving file:\n{current_name}", color=COLOR_TRANSFER, show_activity=True)
         
     except Exception as e:
         debug_print(f"Error starting file transfer: {e}")
@@ -464,7 +728,7 @@ def start_file_transfer(path):
 
 def receive_file_data(data):
     """Receive a chunk of file data"""
-    global current_file, bytes_received, conn_handle, tx_handle
+    global current_file, bytes_received, conn_handle, tx_handle, _progress_dirty, _chunks_since_ack
     
     try:
         if not current_file:
@@ -472,20 +736,29 @@ def receive_file_data(data):
             send_error_response(CMD_FILE_DATA)
             return
             
-        # Write data to file (no sequence extraction for now)
-        bytes_written = current_file.write(data)
-        current_file.flush()  # Force write to storage immediately
-        bytes_received += len(data)
+        # Stage data; the SD card is only written once the buffer fills up
+        buffer_file_data(data)
+        # Globals are read and stored once each; the rest works on locals
+        n = len(data)
+        total = bytes_received + n
+        bytes_received = total
         
-        debug_print(f"Received {len(data)} bytes, wrote {bytes_written}, total: {bytes_received}")
+        if DEBUG_MODE:
+            debug_print(f"Received {n} bytes, buffered {_write_len}, total: {total}")
         
-        # Send simple ACK response
-        response = bytearray([CMD_FILE_DATA, 0])  # Success
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        # Checkpoint ACK once per window rather than per chunk. It carries
+        # the running byte count so the sender can confirm nothing in the
+        # window was lost; a failing chunk still gets its error response.
+        pending = _chunks_since_ack + 1
+        if pending >= ACK_WINDOW:
+            pending = 0
+            struct.pack_into("<BBI", _resp, 0, CMD_FILE_DATA, 0, total)
+            send_reply(_resp_count)
+        _chunks_since_ack = pending
         
-        # Update display periodically (less frequently for better performance)
-        if bytes_received % (CHUNK_SIZE * 10) == 0:  # Update every ~2400 bytes
-            update_display_progress()
+        # Only flag the progress screen; formatting and drawing happen in the
+        # main loop, where scheduled command handling can preempt them
+        _progress_dirty = True
             
     except Exception as e:
         debug_print(f"Error receiving file data: {e}")
@@ -502,17 +775,17 @@ def end_file_transfer(original_filename_data=b''):
             send_error_response(CMD_FILE_END)
             return
             
-        # Close file
+        # Write out the last partial block and close file
+        flush_file_data()
         current_file.close()
         
         # Handle rename if original filename provided
         final_path = current_path
-        if original_filename_data:
+        if len(original_filename_data):
             try:
-                original_filename = original_filename_data.decode('utf-8')
-                # Get directory from current path
-                directory = '/'.join(current_path.split('/')[:-1])
-                new_path = f"{directory}/{original_filename}"
+                # Decoded straight from the RX slot view, no bytes copy
+                original_filename = str(original_filename_data, 'utf-8')
+                new_path = f"{current_dir}/{original_filename}"
                 
                 debug_print(f"Renaming {current_path} to {new_path}")
                 
@@ -532,16 +805,22 @@ def end_file_transfer(original_filename_data=b''):
                 debug_print(f"Warning: Could not rename to original filename: {e}")
                 # Continue with temp filename
         
-        # Send response
-        response = bytearray([CMD_FILE_END, 0])  # Success
-        response.extend(struct.pack("<I", bytes_received))  # Total bytes
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        # Commit the file and its directory entry to the card once, after
+        # the close and any rename, not per chunk (not every port has sync)
+        try:
+            os.sync()
+        except AttributeError:
+            pass
+        
+        # Send response: success + total bytes, packed into the scratch buffer
+        struct.pack_into("<BBI", _resp, 0, CMD_FILE_END, 0, bytes_received)
+        send_reply(_resp_count)
         
         debug_print(f"Transfer complete: {bytes_received} bytes")
         # Show full path if not in default directory, otherwise just filename
         display_path = final_path
         if final_path.startswith(DEFAULT_SCRIPT_DIR):
-            display_path = final_path.split('/')[-1]
+            display_path = path_leaf(final_path)
         
         update_display(f"Transfer complete:\n{display_path}\n{bytes_received} bytes", color=COLOR_SUCCESS, show_activity=False)
         
@@ -561,15 +840,13 @@ def make_directory(path):
     
     try:
         # Ensure path starts with /sd
-        if not path.startswith("/sd"):
-            path = "/sd/" + path.lstrip('/')
+        path = sd_path(path)
             
         # Create directory
         ensure_directory_exists(path)
         
         # Send response
-        response = bytearray([CMD_MKDIR, 0])  # Success
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        send_status(CMD_MKDIR)  # Success
         
         update_display(f"Created directory: {path}", color=COLOR_SUCCESS, show_activity=True)
         
@@ -577,6 +854,32 @@ def make_directory(path):
         debug_print(f"Error creating directory: {e}")
         send_error_response(CMD_MKDIR)
 
+def rmdir_tree(path):
+    """Remove a directory tree without recursion"""
+    # Depth-first with an explicit stack. A directory is scanned once: its
+    # files are removed and it is pushed back, marked done, beneath its
+    # subdirectories, so it comes off again (and is removed) only once they
+    # are gone. Finished directories are not kept around until the end.
+    # ilistdir reports each entry's type from the scan, so no per-entry stat
+    stack = [(path, False)]
+    while stack:
+        directory, scanned = stack.pop()
+        if scanned:
+            os.rmdir(directory)
+            continue
+        stack.append((directory, True))
+        prefix = directory + "/"
+        files = []
+        for item in os.ilistdir(directory):
+            if item[1] & 0x4000:  # Directory
+                stack.append((prefix + item[0], False))
+            else:  # File
+                files.append(item[0])
+        # Remove only once the scan is finished, not underneath the iterator
+        for name in files:
+            os.remove(prefix + name)
+        del files  # Let GC reclaim the names before the next scan
+
 def delete_directory(path):
     """Delete a directory recursively"""
     global conn_handle, tx_handle
@@ -585,26 +888,13 @@ def delete_directory(path):
     
     try:
         # Ensure path starts with /sd
-        if not path.startswith("/sd"):
-            path = "/sd/" + path.lstrip('/')
+        path = sd_path(path)
             
-        # Remove directory recursively
-        import os
-        def rmdir_recursive(directory):
-            for file in os.listdir(directory):
-                full_path = directory + "/" + file
-                stat = os.stat(full_path)
-                if stat[0] & 0x4000:  # Directory
-                    rmdir_recursive(full_path)
-                else:  # File
-                    os.remove(full_path)
-            os.rmdir(directory)
-        
-        rmdir_recursive(path)
+        forget_directory(path)
+        rmdir_tree(path)
         
         # Send response
-        response = bytearray([CMD_DELETE_DIR, 0])  # Success
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        send_status(CMD_DELETE_DIR)  # Success
         
         update_display(f"Deleted directory: {path}", color=COLOR_ERROR, show_activity=True)
         
@@ -620,8 +910,7 @@ def delete_file(path):
     
     try:
         # Ensure path starts with /sd
-        if not path.startswith("/sd"):
-            path = "/sd/" + path.lstrip('/')
+        path = sd_path(path)
         
         # Check if path exists and is a file
         try:
@@ -641,8 +930,7 @@ def delete_file(path):
         os.remove(path)
         
         # Send response
-        response = bytearray([CMD_DELETE, 0])  # Success
-        ble.gatts_notify(conn_handle, tx_handle, response)
+        send_status(CMD_DELETE)  # Success
         
         update_display(f"Deleted file: {path}", color=COLOR_ERROR, show_activity=True)
         
@@ -652,140 +940,221 @@ def delete_file(path):
 
 def ble_irq(event, data):
     """Handle BLE IRQ events"""
-    global is_connected, conn_handle, ble, rx_handle, shutdown_requested
+    global is_connected, conn_handle, ble, rx_handle, shutdown_requested, CHUNK_SIZE
     
     # Ignore events during shutdown
     if shutdown_requested:
         return
         
-    debug_print(f"BLE event: {event}, data: {data}")
+    if DEBUG_MODE:
+        debug_print(f"BLE event: {event}, data: {data}")
     
     if event == _IRQ_CENTRAL_CONNECT:
-        # Store just the first value as conn_handle
-        conn_handle = data[0]  # This should work regardless of tuple structure
+        conn_handle, _, _ = data  # (conn_handle, addr_type, addr)
         is_connected = True
+        # Ask for our larger MTU ourselves rather than waiting for the
+        # client to; the result arrives as _IRQ_MTU_EXCHANGED
+        try:
+            ble.gattc_exchange_mtu(conn_handle)
+        except Exception as e:
+            debug_print(f"MTU exchange request failed: {e}")
         debug_print(f"Connected, handle: {conn_handle}")
-        update_display(f"Connected", color=COLOR_SUCCESS, show_activity=False)
+        # No redraw here: a full frame over SPI would hold up the IRQ, and
+        # the main loop puts up the connected screen on its next pass
         
     elif event == _IRQ_CENTRAL_DISCONNECT:
         is_connected = False
+        CHUNK_SIZE = DEFAULT_CHUNK_SIZE
         debug_print("Disconnected")
         cleanup_transfer()
-        update_display("Disconnected. Ready.", color=COLOR_TRANSFER, show_activity=False)
+        # The main loop switches back to the idle screen on its next pass
         
         # Only restart advertising if not shutting down
         if not shutdown_requested:
             try:
                 debug_print("Restarting advertising")
-                ble.gap_advertise(100000, adv_data=get_adv_payload(device_name))
+                ble.gap_advertise(_ADV_INTERVAL_MS * 1000, adv_data=_adv_payload, resp_data=_scan_resp)
             except Exception as e:
                 debug_print(f"Failed to restart advertising: {e}")
         
+    elif event == _IRQ_MTU_EXCHANGED:
+        # Size notifications to the negotiated MTU (3 bytes of ATT header)
+        _, mtu = data  # (conn_handle, mtu)
+        CHUNK_SIZE = min(mtu, ATT_MTU_MAX) - 3
+        debug_print(f"MTU exchanged: {mtu}, chunk size: {CHUNK_SIZE}")
+        
     elif event == _IRQ_GATTS_WRITE:
         # Handle a client write to a characteristic
-        if len(data) >= 2:  # Ensure we have at least 2 items in data
-            value_handle = data[1]
+        _, value_handle = data  # (conn_handle, attr_handle)
+        if DEBUG_MODE:
             debug_print(f"Write to handle: {value_handle}, rx_handle: {rx_handle}")
-            
-            # Check if the write is to the RX characteristic
-            if value_handle == rx_handle:
-                # Read the data
-                data_bytes = ble.gatts_read(rx_handle)
-                if data_bytes and len(data_bytes) > 0:
-                    debug_print(f"Received data: {bytes(data_bytes).hex()}")
-                    process_command(data_bytes)
+        
+        # Check if the write is to the RX characteristic
+        if value_handle == rx_handle:
+            # Read the data (value_handle is the RX handle, already local)
+            data_bytes = ble.gatts_read(value_handle)
+            if data_bytes:
+                # Length only: a hex dump would allocate a copy and a string
+                # per write, and this runs in the IRQ even with DEBUG_MODE on
+                if DEBUG_MODE:
+                    debug_print(f"Received {len(data_bytes)} bytes")
+                queue_command(data_bytes)
+
+def queue_command(data):
+    """Copy a write into the RX ring and schedule drain_commands"""
+    global _rx_wr
+    
+    # Runs in the IRQ for every write: read the write index once
+    wr = _rx_wr
+    nxt = (wr + 1) % RX_SLOTS
+    if nxt == _rx_rd:
+        debug_print("RX ring full, dropping write")
+        return
+    
+    n = min(len(data), ATT_MTU_MAX)
+    _rx_bufs[wr][:n] = data[:n]
+    _rx_lens[wr] = n
+    _rx_wr = nxt
+    
+    if not _rx_scheduled:
+        schedule_drain()
+
+def schedule_drain():
+    """Schedule drain_commands, leaving the flag clear if the queue is full"""
+    global _rx_scheduled
+    try:
+        micropython.schedule(drain_commands, None)
+        _rx_scheduled = True
+    except RuntimeError:
+        # Schedule queue full; the next write or the main loop retries
+        pass
+
+def drain_commands(_):
+    """Run queued commands outside the IRQ handler"""
+    global _rx_rd, _rx_scheduled
+    
+    # Clear first so a write arriving mid-drain schedules another pass
+    _rx_scheduled = False
+    while _rx_rd != _rx_wr:
+        i = _rx_rd
+        # Hand over a view of the slot; it is only released (rd advanced)
+        # once the command is done with it
+        try:
+            process_command(memoryview(_rx_bufs[i])[:_rx_lens[i]])
+        except Exception as e:
+            print(f"Command error: {e}")
+        _rx_rd = (i + 1) % RX_SLOTS
+
+# Command handlers: each takes a memoryview of the payload after the
+# command byte and decodes it only if it needs a string
+def _do_list_dir(payload):
+    # Default to py_scripts directory when no path is given
+    list_directory(str(payload, 'utf-8') if len(payload) else DEFAULT_SCRIPT_DIR)
+
+def _do_file_info(payload):
+    if len(payload):
+        start_file_transfer(str(payload, 'utf-8'))
+
+def _do_file_data(payload):
+    # Hot path: the view is copied straight into the write buffer
+    if len(payload):
+        receive_file_data(payload)
+
+def _do_file_end(payload):
+    # Optional original filename for the server-side rename; the view is
+    # decoded in end_file_transfer, where a bad name is caught and ignored
+    end_file_transfer(payload)
+
+def _do_mkdir(payload):
+    if len(payload):
+        make_directory(str(payload, 'utf-8'))
+
+def _do_delete(payload):
+    if len(payload):
+        delete_file(str(payload, 'utf-8'))
+
+def _do_delete_dir(payload):
+    if len(payload):
+        delete_directory(str(payload, 'utf-8'))
+
+def _do_flow_control(payload):
+    # ACK snapshot on request: the running byte count of the transfer, so a
+    # sender that missed a checkpoint ACK can resync instead of aborting
+    struct.pack_into("<BBI", _resp, 0, CMD_FLOW_CONTROL, 0 if current_file else 0xFF, bytes_received)
+    send_reply(_resp_count)
+
+# Indexed directly by command byte (CMD_NONE .. CMD_FLOW_CONTROL), so the
+# dispatch is a subscript rather than a dict hash and probe
+_HANDLERS = (
+    None,  # CMD_NONE
+    _do_list_dir,  # CMD_LIST_DIR
+    _do_file_info,  # CMD_FILE_INFO
+    _do_file_data,  # CMD_FILE_DATA
+    _do_file_end,  # CMD_FILE_END
+    _do_mkdir,  # CMD_MKDIR
+    _do_delete,  # CMD_DELETE
+    _do_delete_dir,  # CMD_DELETE_DIR
+    None,  # CMD_ACK (server to client only)
+    None,  # CMD_NACK (server to client only)
+    _do_flow_control,  # CMD_FLOW_CONTROL
+)
+_N_HANDLERS = const(11)
 
 def process_command(data):
     """Process incoming command"""
-    if not data or len(data) < 1 or shutdown_requested:
+    if not len(data) or shutdown_requested:
         return
         
     # First byte is the command
     command = data[0]
-    debug_print(f"Processing command: {command}")
-    
-    # Process commands
-    if command == CMD_LIST_DIR:
-        # List directory
-        if len(data) > 1:
-            path = data[1:].decode('utf-8')
-            list_directory(path)
-        else:
-            # Default to py_scripts directory
-            list_directory(DEFAULT_SCRIPT_DIR)
-            
-    elif command == CMD_FILE_INFO:
-        # Start file transfer
-        if len(data) > 1:
-            path = data[1:].decode('utf-8')
-            start_file_transfer(path)
-            
-    elif command == CMD_FILE_DATA:
-        # File data chunk
-        if len(data) > 1:
-            receive_file_data(data[1:])
-            
-    elif command == CMD_FILE_END:
-        # End file transfer
-        if len(data) > 1:
-            # Original filename provided for rename
-            original_filename_data = data[1:]
-            end_file_transfer(original_filename_data)
-        else:
-            # No original filename provided
-            end_file_transfer()
-            
-    elif command == CMD_MKDIR:
-        # Make directory
-        if len(data) > 1:
-            path = data[1:].decode('utf-8')
-            make_directory(path)
-            
-    elif command == CMD_DELETE:
-        # Delete file
-        if len(data) > 1:
-            path = data[1:].decode('utf-8')
-            delete_file(path)
-            
-    elif command == CMD_DELETE_DIR:
-        # Delete directory
-        if len(data) > 1:
-            path = data[1:].decode('utf-8')
-            delete_directory(path)
+    if DEBUG_MODE:
+        debug_print(f"Processing command: {command}")
+    
+    handler = _HANDLERS[command] if command < _N_HANDLERS else None
+    if handler:
+        handler(memoryview(data)[1:])
     else:
         debug_print(f"Unknown command: {command}")
 
-def get_adv_payload(name):
-    """Generate a BLE advertisement payload for the Nordic UART Service"""
-    # Helper function for simple advertising
-    def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
-        payload = bytearray()
+def _adv_field(adv_type, value):
+    """One advertising data structure: length, AD type, value"""
+    return struct.pack("BB", len(value) + 1, adv_type) + value
 
-        def _append(adv_type, value):
-            nonlocal payload
-            payload += struct.pack("BB", len(value) + 1, adv_type) + value
+def advertising_payload(limited_disc=False, br_edr=False, name=None, services=None, appearance=0, interval_range=None):
+    """Build a BLE advertising payload from the given fields"""
+    payload = bytearray(_adv_field(0x01, struct.pack("B", (0x01 if limited_disc else 0x02) + (0x18 if br_edr else 0x04))))
 
-        _append(0x01, struct.pack("B", (0x01 if limited_disc else 0x02) + (0x18 if br_edr else 0x04)))
+    if name:
+        payload += _adv_field(0x09, name.encode())
 
-        if name:
-            _append(0x09, name.encode())
+    if interval_range:
+        # Peripheral preferred connection interval range, 1.25 ms units
+        payload += _adv_field(0x12, struct.pack("<HH", *interval_range))
 
-        if services:
-            for uuid in services:
-                b = bytes(uuid)
-                if len(b) == 2:
-                    _append(0x02, b)
-                elif len(b) == 4:
-                    _append(0x04, b)
-                elif len(b) == 16:
-                    _append(0x06, b)
+    if services:
+        for uuid in services:
+            b = bytes(uuid)
+            if len(b) == 2:
+                payload += _adv_field(0x02, b)
+            elif len(b) == 4:
+                payload += _adv_field(0x04, b)
+            elif len(b) == 16:
+                payload += _adv_field(0x06, b)
 
-        if appearance:
-            _append(0x19, struct.pack("<h", appearance))
+    if appearance:
+        payload += _adv_field(0x19, struct.pack("<h", appearance))
 
-        return payload
-    
-    return advertising_payload(name=name, services=[_NUS_UUID])
+    return payload
+
+def get_adv_payload(name):
+    """Generate a BLE advertisement payload for the Nordic UART Service"""
+    # The 128-bit service UUID would push the advert past 31 bytes, so it
+    # goes in the scan response (get_scan_response) instead
+    return advertising_payload(name=name, interval_range=(CONN_INTERVAL_MIN, CONN_INTERVAL_MAX))
+
+def get_scan_response():
+    """Generate the scan response: the Nordic UART Service UUID"""
+    return _adv_field(0x06, bytes(_NUS_UUID))
 
 def check_sd_card():
     """Check if SD card is properly mounted"""
@@ -805,7 +1174,8 @@ def init_bluetooth():
         # Create BLE instance
         ble = bluetooth.BLE()
         ble.active(True)
-        global device_name
+        ble.config(mtu=ATT_MTU_MAX)
+        global device_name, _adv_payload, _scan_resp
         # Dynamically generate device name from MAC address
         mac = ble.config('mac')[1]
         suffix = ''.join('%02X' % b for b in mac[-2:])
@@ -825,6 +1195,10 @@ def init_bluetooth():
         try:
             # This is the standard way to register services
             ((tx_handle, rx_handle),) = ble.gatts_register_services(services)
+            # Default RX buffer is 20 bytes; make room for a full-MTU write
+            ble.gatts_set_buffer(rx_handle, ATT_MTU_MAX - 3)
+            # Replies are written into the TX attribute; size it for the largest
+            ble.gatts_set_buffer(tx_handle, len(_resp))
             debug_print(f"Services registered: TX handle: {tx_handle}, RX handle: {rx_handle}")
         except Exception as e:
             debug_print(f"Error registering services: {e}")
@@ -835,8 +1209,10 @@ def init_bluetooth():
         
         # Start advertising
         try:
-            # This is the standard way to advertise
-            ble.gap_advertise(100000, adv_data=get_adv_payload(device_name))
+            # The payload never changes, so build it once for all re-advertises
+            _adv_payload = get_adv_payload(device_name)
+            _scan_resp = get_scan_response()
+            ble.gap_advertise(_ADV_INTERVAL_MS * 1000, adv_data=_adv_payload, resp_data=_scan_resp)
             debug_print(f"Advertising as {device_name}")
         except Exception as e:
             debug_print(f"Error starting advertising: {e}")
@@ -854,9 +1230,8 @@ def check_keyboard_exit():
     Uses the PicoKeyboard.readinto() API to grab raw bytes.
     """
     try:
-        buf = bytearray(1)
-        n = kbd.readinto(buf)              # readinto returns number of bytes read
-        if n and buf[0] == 27:             # 27 == ESC
+        n = kbd.readinto(_key_buf)         # readinto returns number of bytes read
+        if n and _key_buf[0] == 27:        # 27 == ESC
             return True
     except Exception as e:
         debug_print(f"Keyboard check error: {e}")
@@ -881,10 +1256,12 @@ def check_for_exit():
 
 def main():
     """Main function with improved exit handling"""
-    global shutdown_requested, want_exit
+    global shutdown_requested, want_exit, _progress_dirty, _next_ui
     
-    # Force garbage collection before starting
+    # Force garbage collection before starting, then leave further
+    # collections to the allocation threshold instead of the main loop
     gc.collect()
+    arm_gc_threshold()
     
     # Initialize want_exit flag
     want_exit = False
@@ -928,18 +1305,31 @@ def main():
                     shutdown_requested = True
                     break
                 
-                # Brief delay to prevent tight loop
-                time.sleep_ms(50)
+                # The keyboard sits on I2C and cannot be polled with select,
+                # so sleep between checks. While connected, BLE writes are
+                # handled by the scheduled drain during this sleep, so poll
+                # the keyboard less often and leave the bus and CPU to it.
+                time.sleep_ms(CONNECTED_LOOP_MS if is_connected else IDLE_LOOP_MS)
+                
+                # A write whose schedule call found the queue full would sit
+                # in the ring until the next write; the last write of an
+                # upload has no next write, so retry from here
+                if _rx_rd != _rx_wr and not _rx_scheduled:
+                    schedule_drain()
                 
                 # Update display periodically
-                if is_connected and not current_file:
-                    update_display("Connected", color=0x07E0, show_activity=True)
-                elif not is_connected:
+                if current_file:
+                    # Progress redraw, at most every PROGRESS_INTERVAL_MS
+                    if _progress_dirty:
+                        now = time.ticks_ms()
+                        if time.ticks_diff(now, _next_ui) >= 0:
+                            _next_ui = time.ticks_add(now, PROGRESS_INTERVAL_MS)
+                            _progress_dirty = False
+                            update_display_progress()
+                elif is_connected:
+                    show_connected()
+                else:
                     show_idle()
-                
-                # Periodic memory cleanup to prevent fragmentation
-                if not is_connected and not current_file:
-                    gc.collect()
         
         except KeyboardInterrupt:
             print("\nKeyboard interrupt detected")
@@ -955,6 +1345,7 @@ def main():
         
         # Clean up - stop processing new commands
         cleanup_transfer()
+        gc.threshold(-1)  # Restore the default GC policy for whatever runs next
         
         # Stop BLE properly
         if ble:
@@ -15,8 +15,10 @@ import bluetooth
 import time
 import math
 import os
+from array import array
 import utime
 from machine import Pin, PWM
+from sdlog import LOG_DIR, ensure_log_dir
 
 try:
     from mac_prefixes import MAC_PREFIXES
@@ -24,7 +26,7 @@ except ImportError:
     MAC_PREFIXES = {}
 
 # Configuration
-LOG_FILE = "/sd/logs/foxhunt_log.txt"
+LOG_FILE = LOG_DIR + "/foxhunt_log.txt"
 RSSI_AT_1M = -59
 N_FACTOR = 2.0
 SCAN_DURATION = 10  # Not used anymore, keeping for compatibility
@@ -57,6 +59,10 @@ KEY_LEFT = b'\x1b[D'
 KEY_RIGHT = b'\x1b[C'
 KEY_ESC = b'\x1b\x1b'
 
+# Distance in feet for every negative 8-bit RSSI (-128..-1), computed once
+# so the per-advertisement estimate is a table lookup instead of math.pow
+_DIST_FT = array('f', [math.pow(10, (RSSI_AT_1M - r) / (10 * N_FACTOR)) * 3.28084 for r in range(-128, 0)])
+
 class FoxHuntScanner:
     def __init__(self):
         # Display setup
@@ -161,13 +167,9 @@ class FoxHuntScanner:
     
     def rssi_to_distance(self, rssi):
         """Convert RSSI to estimated distance in feet"""
-        try:
-            if rssi >= 0:
-                return 0.1
-            distance_m = math.pow(10, (RSSI_AT_1M - rssi) / (10 * N_FACTOR))
-            return distance_m * 3.28084
-        except:
-            return 999.9
+        if rssi >= 0:
+            return 0.1
+        return _DIST_FT[max(rssi, -128) + 128]
     
     def update_target_data(self, rssi):
         """Update target tracking data"""
@@ -598,11 +600,7 @@ class FoxHuntScanner:
             return
         
         try:
-            log_dir = "/sd/logs"
-            try:
-                os.listdir(log_dir)
-            except OSError:
-                os.mkdir(log_dir)
+            ensure_log_dir()
             
             with open(LOG_FILE, "a") as f:
                 timestamp = utime.ticks_ms()
@@ -6,12 +6,18 @@ Based on ProxiScan 3.0 but with WiFiManager's clean interface
 import bluetooth
 import time
 import os
+from array import array
+from sdlog import LOG_DIR, ensure_log_dir
 
 # Configuration
-LOG_FILE = "/sd/logs/ble_scan_log.txt"
+LOG_FILE = LOG_DIR + "/ble_scan_log.txt"
 RSSI_AT_1M = -59
 N_FACTOR = 2.0
 
+# Distance in metres for every negative 8-bit RSSI (-128..-1), computed once
+# so the per-advertisement estimate is a table lookup instead of a power
+_DIST_M = array('f', [round(10 ** ((RSSI_AT_1M - r) / (10 * N_FACTOR)), 1) for r in range(-128, 0)])
+
 class CompactBLEScanner:
     def __init__(self):
         self.ble = bluetooth.BLE()
@@ -67,13 +73,9 @@ class CompactBLEScanner:
     
     def rssi_to_distance(self, rssi):
         """Convert RSSI to estimated distance in meters"""
-        try:
-            if rssi >= 0:
-                return 0.1
-            distance = 10 ** ((RSSI_AT_1M - rssi) / (10 * N_FACTOR))
-            return round(distance, 1)
-        except:
-            return 999.9
+        if rssi >= 0:
+            return 0.1
+        return _DIST_M[max(rssi, -128) + 128]
     
     def scan_ble_devices(self, duration=10):
         """Scan for BLE devices"""
@@ -197,18 +199,16 @@ class CompactBLEScanner:
             return
         
         try:
-            # Ensure log directory exists
-            log_dir = "/sd/logs"
-            try:
-                os.listdir(log_dir)
-            except OSError:
-                os.mkdir(log_dir)
+            ensure_log_dir()
+            
+            # Build the whole entry first so the file gets a single append
+            lines = [f"\n=== BLE Scan {time.time()} ===\n"]
+            for mac, data in sorted(self.devices.items(), 
+                                   key=lambda x: x[1]['rssi'], reverse=True):
+                lines.append(f"{mac} | {data['rssi']}dBm | {data['distance']}m | {data['name']}\n")
             
             with open(LOG_FILE, "a") as f:
-                f.write(f"\n=== BLE Scan {time.time()} ===\n")
-                for mac, data in sorted(self.devices.items(), 
-                                       key=lambda x: x[1]['rssi'], reverse=True):
-                    f.write(f"{mac} | {data['rssi']}dBm | {data['distance']}m | {data['name']}\n")
+                f.write("".join(lines))
             
             print(f"Logged {len(self.devices)} devices to {LOG_FILE}")
             
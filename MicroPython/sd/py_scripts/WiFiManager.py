@@ -1,20 +1,16 @@
 from brad import connect, load_wifi
 import network
 import time
+from sdlog import LOG_DIR, ensure_log_dir
 
-LOG_FILE = "/sd/logs/wifi_log.txt"
+LOG_FILE = LOG_DIR + "/wifi_log.txt"
 SCAN_TIMEOUT = 5  # seconds
 MAX_RETRIES = 3
 
 def log_to_file(line):
     """Log WiFi scan results to file with proper error handling"""
     try:
-        # Create directory if it doesn't exist
-        try:
-            import os
-            os.makedirs("/sd/logs", exist_ok=True)
-        except:
-            pass
+        ensure_log_dir()
         
         with open(LOG_FILE, "a") as f:
             f.write(f"{time.time()}: {line}\n")
@@ -701,7 +697,7 @@ def main_menu():
                 except ImportError:
                     # Option 2: If that fails, try to launch as subprocess
                     print("Note: BLE Scanner requires restart")
-                    print("Please run 'ProxiScan_3.0' from main menu")
+                    print("Please run 'ProxiScan3' from main menu")
                     input("\nPress Enter to continue...")
             except ImportError:
                 print("BLE Scanner not available")
@@ -770,7 +766,7 @@ def main_menu():
                 except ImportError:
                     # Option 2: If that fails, try to launch as subprocess
                     print("Note: BLE Scanner requires restart")
-                    print("Please run 'ProxiScan_3.0' from main menu")
+                    print("Please run 'ProxiScan3' from main menu")
                     input("\nPress Enter to continue...")
             except ImportError:
                 print("BLE Scanner not available")
@@ -5,6 +5,7 @@ import bluetooth
 import time
 import math
 import os
+from array import array
 
 try:
     from mac_prefixes import MAC_PREFIXES
@@ -17,8 +18,17 @@ RSSI_AT_1M = -59
 N_FACTOR = 2.0
 DISPLAY_WIDTH = 320
 
+# Distance in feet for every negative 8-bit RSSI (-128..-1), computed once
+# so rssi_to_distance is a table lookup instead of math.pow per device
+_DIST_FT = array('f', [math.pow(10, (RSSI_AT_1M - r) / (10 * N_FACTOR)) * 3.28084 for r in range(-128, 0)])
+
 device_memory = {}
 
+# Log lines are collected here and written with one append per scan cycle
+# (or once the buffer reaches about one 8 KB FAT cluster)
+LOG_FLUSH_BYTES = 8192
+_LOG_BUF = bytearray()
+
 def show_devices_ble(ble_data):
     print("\n=== BLE Devices (Grouped by Vendor/Name) ===")
     grouped = {}
@@ -67,8 +77,7 @@ def rssi_to_distance(rssi):
         rssi = int(rssi)
         if rssi >= 0:
             return 0.1
-        distance_m = math.pow(10, (RSSI_AT_1M - rssi) / (10 * N_FACTOR))
-        return distance_m * 3.28084
+        return _DIST_FT[max(rssi, -128) + 128]
     except:
         return 0.0
 
@@ -137,22 +146,33 @@ def scan_wifi_devices():
     return results
 
 def log_to_file(content):
+    _LOG_BUF.extend(content.encode('utf-8'))
+    _LOG_BUF.append(0x0A)
+    if len(_LOG_BUF) >= LOG_FLUSH_BYTES:
+        flush_log()
+
+def flush_log():
+    global _LOG_BUF
+    if not _LOG_BUF:
+        return
     try:
         log_dir = "/sd/logs"
         try:
             os.listdir(log_dir)
         except OSError:
             os.mkdir(log_dir)
-        with open(LOG_FILE, "a") as logf:
-            logf.write(content + "\n")
+        with open(LOG_FILE, "ab") as logf:
+            logf.write(_LOG_BUF)
     except Exception as e:
         print("Logging error:", e)
+    _LOG_BUF = bytearray()
 
 def scan_combined():
     wifi = scan_wifi_devices()
     ble = scan_ble_devices()
     show_devices_ble(ble)
     show_devices_wifi(wifi)
+    flush_log()
 
 def main():
     print("=== 2-Line UI BLE + WiFi Scanner ===")
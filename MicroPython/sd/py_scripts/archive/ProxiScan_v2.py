@@ -3,6 +3,7 @@ import bluetooth
 import time
 import math
 import os
+from array import array
 import network
 try:
     from mac_prefixes import MAC_PREFIXES
@@ -15,9 +16,18 @@ RSSI_AT_1M = -59
 N_FACTOR = 2.0
 DISPLAY_WIDTH = 320
 
+# Distance for every 8-bit RSSI from -128 to 0, computed once so
+# rssi_to_distance is a table lookup instead of a power per device
+_DIST = array('f', [10 ** ((RSSI_AT_1M - r) / (10 * N_FACTOR)) for r in range(-128, 1)])
+
 device_memory = {}
 ble_devices = {}
 
+# Log lines are collected here and written with one append per scan
+# (or once the buffer reaches about one 8 KB FAT cluster)
+LOG_FLUSH_BYTES = 8192
+_LOG_BUF = bytearray()
+
 def parse_apple_data(mfg_data):
     """Parse Apple-specific manufacturer data (Company ID: 0x004C)"""
     if len(mfg_data) < 4:
@@ -150,14 +160,24 @@ def parse_ibeacon(mfg_data):
     return None
 
 def rssi_to_distance(rssi):
-    return 10 ** ((RSSI_AT_1M - rssi) / (10 * N_FACTOR))
+    return _DIST[max(-128, min(0, rssi)) + 128]
 
 def log_to_file(line):
+    _LOG_BUF.extend(line.encode('utf-8'))
+    _LOG_BUF.append(0x0A)
+    if len(_LOG_BUF) >= LOG_FLUSH_BYTES:
+        flush_log()
+
+def flush_log():
+    global _LOG_BUF
+    if not _LOG_BUF:
+        return
     try:
-        with open(LOG_FILE, "a") as f:
-            f.write(line + "\n")
+        with open(LOG_FILE, "ab") as f:
+            f.write(_LOG_BUF)
     except:
         pass
+    _LOG_BUF = bytearray()
 
 def get_vendor_label(mac):
     prefix = mac.upper()[0:8]
@@ -273,6 +293,8 @@ def show_devices_ble(ble_data):
 
             log_to_file(f"BLE: {mac} | RSSI: {rssi} | Name: {name} | Manufacturer: {extra.get('manufacturer', {})} | Extra: {extra}")
 
+    flush_log()
+
 def get_adv_name(adv_data):
     """FIXED: Handle memoryview objects"""
     try:
@@ -330,6 +352,7 @@ def scan_wifi():
         security = {0: "Open", 1: "WEP", 2: "WPA-PSK", 3: "WPA2-PSK", 4: "WPA/WPA2-PSK"}.get(auth, "Unknown")
         print(f"- {ssid:<20} | {rssi:>4} dBm | Ch: {channel:<2} | {security} | {mac}")
         log_to_file(f"WIFI: {ssid} | RSSI: {rssi} | Ch: {channel} | {security} | MAC: {mac}")
+    flush_log()
 
 def main():
     print("Starting BLE scan... Give 30 Seconds BRB")
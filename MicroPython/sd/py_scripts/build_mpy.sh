@@ -0,0 +1,33 @@
+#!/bin/sh
+# Precompile the NetworkTools modules and PicoBLE to .mpy bytecode (run on
+# the host).
+#
+# Copy the resulting mpy/ directory to /sd/mpy on the card. boot.py puts
+# /sd/mpy ahead of /sd/py_scripts on sys.path, so imports load the
+# bytecode and skip parsing/compiling on the device. Re-run after editing
+# a script, or delete its .mpy, otherwise the stale bytecode wins.
+#
+# Override MPY_ARCH for other boards (armv6m for the RP2040 Pico).
+
+MPY_CROSS=${MPY_CROSS:-mpy-cross}
+MPY_ARCH=${MPY_ARCH:-armv7emsp}
+MPY_OPT=${MPY_OPT:--O2}
+
+cd "$(dirname "$0")" || exit 1
+mkdir -p mpy
+
+# A module that fails to compile is reported and skipped, so the others are
+# still built; the script exits non-zero if any failed.
+failed=""
+for mod in PicoBLE sdlog WiFiManager ProxiScan_compact ProxiScan3 FoxHunt_lite FoxHunt_competition; do
+    echo "Compiling $mod.py"
+    if ! "$MPY_CROSS" -march="$MPY_ARCH" "$MPY_OPT" -o "mpy/$mod.mpy" "$mod.py"; then
+        rm -f "mpy/$mod.mpy"  # Do not leave stale bytecode shadowing the source
+        failed="$failed $mod"
+    fi
+done
+
+if [ -n "$failed" ]; then
+    echo "Failed to compile:$failed" >&2
+    exit 1
+fi
@@ -0,0 +1,19 @@
+"""
+sdlog.py - Log directory helper shared by the scanner and Wi-Fi scripts
+"""
+import os
+
+LOG_DIR = "/sd/logs"
+
+_log_dir_ready = False
+
+def ensure_log_dir():
+    """Create LOG_DIR on first use; later calls return without touching the card"""
+    global _log_dir_ready
+    if _log_dir_ready:
+        return
+    try:
+        os.stat(LOG_DIR)
+    except OSError:
+        os.mkdir(LOG_DIR)
+    _log_dir_ready = True